@@ -0,0 +1,23 @@
+import time
+import join_cascading
+
+# Build (or refresh) the saved extracted-side index that join_cascading.py loads.
+# Workbook, INDEX_DIR and index settings (RANK_BY, FUZZY_*) come from join_cascading.py,
+# so the saved index always matches what the join expects.
+
+# --- CONFIGURATION ---
+# True: rebuild even when the saved index is up to date
+FORCE = False
+
+
+def main():
+    if not join_cascading.INDEX_DIR:
+        raise ValueError("❌ INDEX_DIR is not set in join_cascading.py; there is nowhere to save the index.")
+    start_time = time.perf_counter()
+    index = join_cascading.load_index(rebuild=FORCE)
+    print(f"✅ {len(index.table)} extracted rows, {len(index.postings)} keys over levels "
+          f"{' → '.join(index.levels)} ({time.perf_counter() - start_time:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,420 @@
+import os
+import itertools
+import multiprocessing as mp
+from collections import deque
+import numpy as np
+import pandas as pd
+from cascade_keys import LEVELS, NULL_KEY, key_column, part_column, drop_match_keys
+from fuzzy_keys import FUZZY_LEVELS, FuzzyKeyIndex
+from match_summary import pair_matches
+
+UNMATCHED = 'Unmatched'
+KEEP_ALL = 'all'
+# Fuzzy level -> (key part it matches within a BIN, exact level whose key codes it looks up)
+FUZZY_PARTS = {level: (part, exact_level) for level, part, exact_level in FUZZY_LEVELS}
+
+
+def parse_fanout(policy):
+    """
+    Fan-out policy for one level -> (mode, limit):
+    - 'all' (or missing):  keep every match
+    - ('cap', k):          keep the k best-ranked matches per top-N row
+    - ('aggregate', n):    keep one row per top-N row, with Match_Count and a sample of n values
+    """
+    if policy is None or policy == KEEP_ALL:
+        return KEEP_ALL, 0
+    mode, limit = policy
+    if mode not in ('cap', 'aggregate') or int(limit) < 1:
+        raise ValueError(f"Unknown fan-out policy: {policy!r}")
+    return mode, int(limit)
+
+
+def check_fanout(fanout):
+    """Validate a {level: policy} dict up front, so a typo fails before the join starts."""
+    levels = [level for level, _ in LEVELS] + list(FUZZY_PARTS)
+    for level, policy in (fanout or {}).items():
+        if level not in levels:
+            raise ValueError(f"Unknown cascade level in fan-out policies: {level!r} (expected one of {levels})")
+        parse_fanout(policy)
+    return fanout or {}
+
+
+def describe_fanout(policy):
+    mode, limit = parse_fanout(policy)
+    if mode == 'cap':
+        return f'cap {limit}'
+    if mode == 'aggregate':
+        return f'aggregate (sample {limit})'
+    return KEEP_ALL
+
+
+class CascadeIndex:
+    """
+    Extracted-side lookup structures, built once and reused for every top-N chunk:
+    - level_keys: sorted unique key codes per level, for "does this level hit?" lookups
+    - postings:   (level, key, row position) for every extracted row that has a key,
+                  sorted so one merge returns matches in the same order as a per-level merge
+    - table:      the extracted rows themselves (without key columns), for the final take
+    - rank:       each extracted row's position in tie-breaker order (rank_by columns,
+                  file order when None); decides which matches a capped level keeps
+    - key_counts: extracted rows per (level, key), for the pre-join size estimate
+    - levels:     level names in precedence order; a level's position is its level id
+    - fuzzy:      {fuzzy level: FuzzyKeyIndex} for the fuzzy levels that are on
+
+    fuzzy_distance > 0 adds the FUZZY_GRP level right after `fuzzy_after`: same BIN, GRP within
+    that many edits. fuzzy_pcn_distance > 0 adds the FUZZY_PCN level right after BIN_PCN (after BIN
+    it would never fire): same BIN, PCN within that many edits. Both skip values shorter than
+    fuzzy_min_length. Their matches are the extracted rows of the near-miss BIN+GRP / BIN+PCN keys,
+    so they need add_match_keys(..., keep_parts=True) on both sides.
+    """
+
+    def __init__(self, extracted, rank_by=None, ascending=True, fuzzy_distance=0, fuzzy_min_length=4, fuzzy_after='GRP',
+                 fuzzy_pcn_distance=0):
+        self.table = drop_match_keys(extracted).reset_index(drop=True)
+        self.levels = [level for level, _ in LEVELS]
+        if fuzzy_distance and fuzzy_after not in self.levels:
+            raise ValueError(f"Unknown cascade level for fuzzy_after: {fuzzy_after!r} (expected one of {self.levels})")
+        settings = {'FUZZY_GRP': (fuzzy_distance, fuzzy_after), 'FUZZY_PCN': (fuzzy_pcn_distance, 'BIN_PCN')}
+        self.fuzzy = {}
+        for level, (part, exact_level) in FUZZY_PARTS.items():
+            distance, after = settings[level]
+            if not distance:
+                continue
+            self.levels.insert(self.levels.index(after) + 1, level)
+            self.fuzzy[level] = FuzzyKeyIndex(
+                extracted[part_column('BIN')], extracted[part_column(part)], extracted[key_column(exact_level)].to_numpy(),
+                max_distance=distance, min_length=fuzzy_min_length,
+            )
+
+        postings = []
+        for level_id, level in enumerate(self.levels):
+            codes = extracted[key_column(FUZZY_PARTS[level][1] if level in self.fuzzy else level)].to_numpy()
+            has_key = np.flatnonzero(codes != NULL_KEY)
+            postings.append(pd.DataFrame({
+                '_level': np.full(len(has_key), level_id, dtype=np.int8),
+                '_key': codes[has_key],
+                '_right_pos': has_key,
+            }))
+        self.postings = pd.concat(postings, ignore_index=True)
+
+        self.rank = np.arange(len(self.table))
+        if rank_by:
+            order = self.table.sort_values(rank_by, ascending=ascending, kind='stable', na_position='last').index
+            self.rank[order.to_numpy()] = np.arange(len(order))
+        self._build_lookups()
+
+    @classmethod
+    def from_parts(cls, table, levels, postings, rank, fuzzy=None):
+        """Reassemble an index from its saved parts (see index_store), without the extracted key columns."""
+        index = cls.__new__(cls)
+        index.table, index.levels, index.postings, index.rank = table, list(levels), postings, rank
+        index.fuzzy = fuzzy or {}
+        index._build_lookups()
+        return index
+
+    def _build_lookups(self):
+        levels = self.postings['_level'].to_numpy()
+        keys = self.postings['_key'].to_numpy()
+        self.level_keys = {level: np.unique(keys[levels == level_id]) for level_id, level in enumerate(self.levels)}
+        self.key_counts = self.postings.groupby(['_level', '_key']).size().rename('_count').reset_index()
+
+
+def resolve_levels(left, index):
+    """
+    For each left row, the first cascade level whose key exists on the extracted side.
+    Returns (level id per row, -1 when unmatched; the keys to look up, as _level/_key/_left_pos/_distance).
+    Exact levels want one key per matched row; a fuzzy level can want several equally close keys.
+    """
+    level_ids = np.full(len(left), -1, dtype=np.int8)
+    keys = np.full(len(left), NULL_KEY, dtype=np.int64)
+    fuzzy = []
+    for level_id, level in enumerate(index.levels):
+        open_rows = level_ids == -1
+        if level in index.fuzzy:
+            candidates = np.flatnonzero(open_rows)
+            part = FUZZY_PARTS[level][0]
+            hits = index.fuzzy[level].lookup(
+                left[part_column('BIN')].iloc[candidates], left[part_column(part)].iloc[candidates])
+            hits['_pos'] = candidates[hits['_pos'].to_numpy()]
+            level_ids[hits['_pos'].to_numpy()] = level_id
+            if len(hits):
+                fuzzy.append(pd.DataFrame({
+                    '_level': np.full(len(hits), level_id, dtype=np.int8),
+                    '_key': hits['_key'].to_numpy(),
+                    '_left_pos': hits['_pos'].to_numpy(),
+                    '_distance': hits['_distance'].to_numpy(),
+                }))
+            continue
+        codes = left[key_column(level)].to_numpy()
+        hit = open_rows & (codes != NULL_KEY) & np.isin(codes, index.level_keys[level])
+        level_ids[hit] = level_id
+        keys[hit] = codes[hit]
+
+    exact = np.flatnonzero((level_ids >= 0) & (keys != NULL_KEY))
+    wanted = pd.DataFrame({
+        '_level': level_ids[exact], '_key': keys[exact], '_left_pos': exact, '_distance': np.zeros(len(exact), dtype=np.int8),
+    })
+    if fuzzy:
+        wanted = pd.concat([wanted] + fuzzy, ignore_index=True)
+    return level_ids, wanted
+
+
+def match_pairs(left, index):
+    """
+    (left position, extracted row position, level id, edit distance) for every match, in cascade
+    output order, plus each left row's level id. The distance is 0 except on the fuzzy levels.
+    """
+    level_ids, wanted = resolve_levels(left, index)
+    pairs = wanted.merge(index.postings, on=['_level', '_key'], how='inner')
+
+    # Level order first, then left row order, then extracted rows in tie-breaker order
+    right_pos = pairs['_right_pos'].to_numpy()
+    order = np.lexsort((index.rank[right_pos], pairs['_left_pos'].to_numpy(), pairs['_level'].to_numpy()))
+    pairs = pairs.iloc[order]
+    return (pairs['_left_pos'].to_numpy(), pairs['_right_pos'].to_numpy(), pairs['_level'].to_numpy(),
+            pairs['_distance'].to_numpy(), level_ids)
+
+
+def match_groups(left_pos):
+    """
+    For pairs ordered by match_pairs (each left row's matches are contiguous):
+    the position of each pair within its left row's matches, and that row's total match count.
+    """
+    n = len(left_pos)
+    starts = np.flatnonzero(np.r_[True, left_pos[1:] != left_pos[:-1]]) if n else np.empty(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, n])
+    return np.arange(n) - np.repeat(starts, sizes), np.repeat(sizes, sizes)
+
+
+def apply_fanout(left_pos, right_pos, pair_levels, fanout, index, sample_column=None):
+    """
+    Apply per-level fan-out policies to ordered match pairs.
+    Returns (kept pair mask, Match_Count per pair, Match_Sample per pair or None).
+    """
+    within, match_count = match_groups(left_pos)
+    keep = np.ones(len(left_pos), dtype=bool)
+    sample_limit = np.zeros(len(left_pos), dtype=np.int64)
+    for level_id, level in enumerate(index.levels):
+        mode, limit = parse_fanout(fanout.get(level))
+        at_level = pair_levels == level_id
+        if mode == 'cap':
+            keep[at_level & (within >= limit)] = False
+        elif mode == 'aggregate':
+            keep[at_level & (within > 0)] = False
+            sample_limit[at_level] = limit
+
+    if sample_column is None or not sample_limit.any():
+        return keep, match_count, None
+
+    # First n distinct values (in tie-breaker order) of every aggregated row's matches
+    aggregated = np.flatnonzero(sample_limit > 0)
+    values = pd.DataFrame({
+        '_left_pos': left_pos[aggregated],
+        '_value': index.table[sample_column].take(right_pos[aggregated]).to_numpy(),
+        '_limit': sample_limit[aggregated],
+    }).dropna(subset=['_value']).drop_duplicates(['_left_pos', '_value'])
+    values['_value'] = values['_value'].astype(str)
+    values = values[values.groupby('_left_pos', sort=False).cumcount().to_numpy() < values['_limit'].to_numpy()]
+    samples = values.groupby('_left_pos', sort=False)['_value'].agg(' | '.join)
+
+    match_sample = pd.Series(left_pos).map(samples).to_numpy(dtype=object)
+    match_sample[sample_limit == 0] = None
+    return keep, match_count, match_sample
+
+
+def estimate_fanout(left, index, fanout=None):
+    """
+    Output rows per level before anything is joined, from the extracted-side key counts.
+    Uses the same level resolution as the join, so 'Output Rows' is exactly what will be written.
+    """
+    fanout = check_fanout(fanout)
+    level_ids, wanted = resolve_levels(left, index)
+    matched = level_ids >= 0
+    # Matches per left row (a fuzzy row's near-miss keys add up)
+    per_row = wanted.merge(index.key_counts, on=['_level', '_key'], how='left').groupby(['_left_pos', '_level'])['_count'].sum()
+    counts = per_row.to_numpy()
+    wanted_levels = per_row.index.get_level_values('_level').to_numpy()
+
+    rows = []
+    for level_id, level in enumerate(index.levels):
+        level_counts = counts[wanted_levels == level_id]
+        mode, limit = parse_fanout(fanout.get(level))
+        if mode == 'cap':
+            output_rows = int(np.minimum(level_counts, limit).sum())
+        elif mode == 'aggregate':
+            output_rows = len(level_counts)
+        else:
+            output_rows = int(level_counts.sum())
+        rows.append({
+            'Level': level,
+            'Policy': describe_fanout(fanout.get(level)),
+            'Rows Matched': len(level_counts),
+            'Max Matches/Row': int(level_counts.max()) if len(level_counts) else 0,
+            'Output Rows (keep all)': int(level_counts.sum()),
+            'Output Rows': output_rows,
+        })
+    unmatched = int((~matched).sum())
+    rows.append({
+        'Level': UNMATCHED, 'Policy': '', 'Rows Matched': unmatched, 'Max Matches/Row': 0,
+        'Output Rows (keep all)': unmatched, 'Output Rows': unmatched,
+    })
+    return pd.DataFrame(rows)
+
+
+def cascade_pairs(left, index, fanout=None, sample_column=None, debug=False):
+    """
+    Cascade-match `left` (with key columns from add_match_keys) against the extracted side.
+    Each left row keeps the extracted rows that match at its first hitting level, subject to
+    that level's fan-out policy (see parse_fanout; levels without a policy keep every match);
+    rows with no hit at any level are kept once with Matched_Level = 'Unmatched'.
+
+    Returns one row per output row: _left_pos (position in `left`), _right_pos (position in
+    index.table, -1 when unmatched) and Matched_Level. With any cap/aggregate policy, Match_Count
+    holds each row's total matches before the policy, and aggregated levels get Match_Sample
+    from `sample_column` of the extracted side. With a fuzzy level, Fuzzy_Distance holds the GRP/PCN
+    edit distance of FUZZY_GRP/FUZZY_PCN rows (empty on every other row).
+    """
+    fanout = check_fanout(fanout)
+    left_pos, right_pos, pair_levels, distances, level_ids = match_pairs(left, index)
+
+    limited = any(parse_fanout(policy)[0] != KEEP_ALL for policy in fanout.values())
+    with_sample = sample_column is not None and any(parse_fanout(policy)[0] == 'aggregate' for policy in fanout.values())
+    if limited:
+        keep, match_count, match_sample = apply_fanout(left_pos, right_pos, pair_levels, fanout, index, sample_column)
+        left_pos, right_pos, pair_levels, match_count = left_pos[keep], right_pos[keep], pair_levels[keep], match_count[keep]
+        distances = distances[keep]
+        if match_sample is not None:
+            match_sample = match_sample[keep]
+
+    if debug:
+        for level_id, level in enumerate(index.levels):
+            rows = int((level_ids == level_id).sum())
+            print(f"Level: {level} -> {rows} rows matched, {int((pair_levels == level_id).sum())} output rows")
+        print(f"Unmatched: {int((level_ids == -1).sum())} rows")
+
+    unmatched_pos = np.flatnonzero(level_ids == -1)
+    pairs = pd.DataFrame({
+        '_left_pos': np.concatenate([left_pos, unmatched_pos]),
+        '_right_pos': np.concatenate([right_pos, np.full(len(unmatched_pos), -1)]),
+        'Matched_Level': np.concatenate([
+            np.array(index.levels, dtype=object)[pair_levels],
+            np.full(len(unmatched_pos), UNMATCHED, dtype=object),
+        ]),
+    })
+    if index.fuzzy:
+        fuzzy_distance = pd.array(np.concatenate([distances, np.zeros(len(unmatched_pos), dtype=np.int8)]), dtype='Int8')
+        fuzzy_distance[~pairs['Matched_Level'].isin(list(index.fuzzy)).to_numpy()] = pd.NA
+        pairs['Fuzzy_Distance'] = fuzzy_distance
+
+    # Same columns in every chunk, whether or not a capped/aggregated level hit in it
+    if limited:
+        pairs['Match_Count'] = np.concatenate([match_count, np.zeros(len(unmatched_pos), dtype=match_count.dtype)])
+    if with_sample:
+        pairs['Match_Sample'] = None
+        if match_sample is not None:
+            pairs.loc[:len(match_sample) - 1, 'Match_Sample'] = match_sample
+    return pairs
+
+
+def widen_pairs(left_table, right_table, pairs):
+    """
+    Wide rows for a pair table: the left row's columns, then the matched right row's columns
+    (suffixed '_matched' where the names clash), then Matched_Level and any Fuzzy_Distance/Match_* columns.
+    Unmatched pairs (_right_pos -1) come out with the right-side columns empty.
+    """
+    right_pos = pairs['_right_pos'].to_numpy()
+    extra = pairs.drop(columns=['_left_pos', '_right_pos'])
+    is_matched = right_pos >= 0
+
+    right = right_table.take(right_pos[is_matched]).reset_index(drop=True)
+    right.columns = [f'{c}_matched' if c in left_table.columns else c for c in right.columns]
+    matched = pd.concat([
+        left_table.take(pairs['_left_pos'].to_numpy()[is_matched]).reset_index(drop=True),
+        right,
+        extra[is_matched].reset_index(drop=True),
+    ], axis=1)
+    unmatched = pd.concat([
+        left_table.take(pairs['_left_pos'].to_numpy()[~is_matched]).reset_index(drop=True),
+        extra[~is_matched].reset_index(drop=True),
+    ], axis=1)
+
+    parts = [frame for frame in (matched, unmatched) if not frame.empty]
+    if not parts:
+        return matched
+    return pd.concat(parts, ignore_index=True)
+
+
+def cascade_join(left, index, fanout=None, sample_column=None, debug=False):
+    """Wide form of cascade_pairs: every output row carries all columns of both sides."""
+    pairs = cascade_pairs(left, index, fanout=fanout, sample_column=sample_column, debug=debug)
+    return widen_pairs(drop_match_keys(left).reset_index(drop=True), index.table, pairs)
+
+
+# Worker state for the parallel join: inherited through fork (copy-on-write, nothing pickled),
+# or sent once per worker by the pool initializer where only spawn is available (Windows)
+_worker_state = {}
+
+
+def _init_worker(left, index, output, summary_key, options):
+    _worker_state.update(left=left, index=index, output=output, summary_key=summary_key, options=options)
+
+
+def _join_chunk(task):
+    chunk_num, start, stop = task
+    chunk = _worker_state['left'].iloc[start:stop]
+    index = _worker_state['index']
+    pairs = cascade_pairs(chunk, index, **_worker_state['options'])
+
+    summary_key = _worker_state['summary_key']
+    matches = pair_matches(pairs, chunk[summary_key].to_numpy()) if summary_key else None
+    if _worker_state['output'] == 'pairs':
+        pairs['_left_pos'] += start
+        return chunk_num, len(pairs), pairs, matches
+    result = widen_pairs(drop_match_keys(chunk).reset_index(drop=True), index.table, pairs)
+    return chunk_num, len(result), result.to_csv(index=False, header=chunk_num == 1), matches
+
+
+def chunk_bounds(n_rows, chunk_size):
+    """(start, stop) of each chunk: the same boundaries as np.array_split(df, n_rows // chunk_size + 1)."""
+    sizes = np.array([len(part) for part in np.array_split(np.arange(n_rows), max(1, n_rows // chunk_size + 1))])
+    stops = np.cumsum(sizes)
+    return list(zip((stops - sizes).tolist(), stops.tolist()))
+
+
+def iter_join_chunks(left, index, chunk_size, workers=None, output='csv', summary_key=None, **options):
+    """
+    Cascade-join `left` in chunks across a process pool; yields (chunk number, rows, result, matches)
+    in chunk order, so the caller can stream results straight into one output. The result is
+    - output='csv':   the wide rows as CSV text, header on chunk 1 only (formatted in the workers)
+    - output='pairs': the cascade_pairs table, with _left_pos as a position in the whole of `left`
+    With a summary_key column, matches is the chunk's pair_matches for MatchSummary.add (else None).
+    At most two chunks per worker are in flight, which bounds memory when the writer falls behind.
+    workers=1 runs in-process.
+    """
+    if output not in ('csv', 'pairs'):
+        raise ValueError(f"Unknown join output: {output!r}. Use 'csv' or 'pairs'.")
+    tasks = iter([(num, start, stop) for num, (start, stop) in enumerate(chunk_bounds(len(left), chunk_size), start=1)])
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(left, index, output, summary_key, options)
+        try:
+            yield from map(_join_chunk, tasks)
+        finally:
+            _worker_state.clear()
+        return
+
+    if 'fork' in mp.get_all_start_methods():
+        _init_worker(left, index, output, summary_key, options)
+        pool = mp.get_context('fork').Pool(workers)
+    else:
+        pool = mp.get_context('spawn').Pool(workers, initializer=_init_worker, initargs=(left, index, output, summary_key, options))
+    try:
+        with pool:
+            pending = deque(pool.apply_async(_join_chunk, (task,)) for task in itertools.islice(tasks, 2 * workers))
+            while pending:
+                result = pending.popleft().get()
+                for task in itertools.islice(tasks, 1):
+                    pending.append(pool.apply_async(_join_chunk, (task,)))
+                yield result
+    finally:
+        _worker_state.clear()
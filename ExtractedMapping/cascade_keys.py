@@ -0,0 +1,59 @@
+import os
+import sys
+import numpy as np
+
+# Shared BIN/PCN/GRP key normalization lives with the other pipeline modules in code/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+from bpg_keys import per_unique, clean_text_key, normalize_keys, level_codes
+
+# Cascade levels, most specific first: (Matched_Level label, parts that make up the key)
+LEVELS = [
+    ('BPG', ('BIN', 'PCN', 'GRP')),
+    ('BIN_GRP', ('BIN', 'GRP')),
+    ('GRP', ('GRP',)),
+    ('BIN_PCN', ('BIN', 'PCN')),
+    ('BIN', ('BIN',)),
+]
+
+# Hash code used for rows that don't have every part of a level's key
+NULL_KEY = np.int64(-1)
+
+
+def key_column(level):
+    return f'_key_{level}'
+
+
+def part_column(part):
+    return f'_key_part_{part}'
+
+
+def _format_bins(values):
+    s = clean_text_key(values)
+    return s.str.split('.', n=1).str[0].str.zfill(6)
+
+
+def format_bin_column(values):
+    """
+    BINs as zero-padded 6-digit display strings (decimals dropped), computed once per distinct value.
+    Unlike the match keys, text that isn't a number is kept as-is so it still shows in the output.
+    """
+    return per_unique(values, _format_bins)
+
+
+def add_match_keys(df, bin_col, pcn_col, grp_col, keep_parts=False):
+    """
+    Add one int64 code column per cascade level (see key_column). Computed once per table from the
+    compact keys of bpg_keys.normalize_keys: rows missing a part of a level's key get NULL_KEY.
+    keep_parts also keeps the compact BIN/PCN/GRP values (see part_column) for the fuzzy levels.
+    """
+    keys = normalize_keys(df, bin_col, pcn_col, grp_col)
+    for level, names in LEVELS:
+        df[key_column(level)] = level_codes(keys, names, NULL_KEY)
+    if keep_parts:
+        for part in ['BIN', 'PCN', 'GRP']:
+            df[part_column(part)] = keys[part]
+    return df
+
+
+def drop_match_keys(df):
+    return df.drop(columns=[c for c in df.columns if c.startswith('_key_')])
@@ -1,36 +1,20 @@
 import pandas as pd
+from match_summary import summarize_csv
 
-merged_file = "merged_output_BPG_fallback_cascade_batchwiseX.csv"
-df_merged = pd.read_csv(merged_file, low_memory=False)
-
-rule_col_candidates = ['Matched_Level', 'rule_applied', 'rule_used']
-rule_col = next((col for col in rule_col_candidates if col in df_merged.columns), None)
-if not rule_col:
-    raise ValueError("❌ No rule match column found. Please ensure your join script includes rule name per match.")
-
-df_merged[rule_col] = df_merged[rule_col].fillna('No Match')
-
-df_matched = df_merged[df_merged[rule_col] != 'Unmatched']
-df_matched = df_matched[df_matched[rule_col] != 'No Match']
-
-summary = (
-    df_matched
-    .groupby(['BPG_top10k'])[rule_col]
-    .agg([
-        ('Match_Count', 'count'),
-        ('Rules_Used', lambda x: ', '.join(sorted(set(x))))
-    ])
-    .reset_index()
-)
+# Standalone summary for a join CSV that already exists. join_cascading.py writes the same
+# summary itself while it joins (summary_path), so this is only needed for older outputs.
 
-df2 = pd.read_excel('payer_data_020725_test.xlsx', sheet_name='Key+top10k')
-df2['_original_index'] = df2.index
-
-summary = df2[['BPG_top10k','_original_index']].drop_duplicates().merge(summary, on='BPG_top10k', how='left')
-summary = summary.sort_values('_original_index').drop(columns=['_original_index'])
-
-summary['Match_Count'] = summary['Match_Count'].fillna(0).astype(int)
-summary['Rules_Used'] = summary['Rules_Used'].fillna('No Match')
-
-summary.to_csv("summary_match_counts_BPG_finalX.csv", index=False)
-print("✅ Summary saved to: summary_match_counts_BPG_finalX.csv")
\ No newline at end of file
+# --- CONFIGURATION ---
+merged_file = "merged_output_BPG_fallback_cascade_batchwiseX.csv"
+top10k_file = 'payer_data_020725_test.xlsx'
+summary_file = "summary_match_counts_BPG_finalX.csv"
+KEY_COLUMN = 'BPG_top10k'
+# CSV rows read at a time; only the key/rule columns are loaded
+CHUNK_SIZE = 200_000
+
+summary = summarize_csv(merged_file, KEY_COLUMN, chunksize=CHUNK_SIZE)
+
+# One summary row per top10k row, in top10k order
+df2 = pd.read_excel(top10k_file, sheet_name='Key+top10k', usecols=[KEY_COLUMN], dtype={KEY_COLUMN: str})
+summary.table(df2[KEY_COLUMN], KEY_COLUMN).to_csv(summary_file, index=False)
+print(f"✅ Summary saved to: {summary_file}")
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from rapidfuzz.distance import Levenshtein
+
+# Fuzzy cascade levels: (Matched_Level label, key part matched within a BIN, exact level whose key codes it returns)
+FUZZY_LEVELS = [
+    ('FUZZY_GRP', 'GRP', 'BIN_GRP'),
+    ('FUZZY_PCN', 'PCN', 'BIN_PCN'),
+]
+
+
+def deletion_variants(text, max_deletions):
+    """`text` plus every string made by deleting up to `max_deletions` of its characters."""
+    variants = {text}
+    frontier = {text}
+    for _ in range(max_deletions):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        variants |= frontier
+    return variants
+
+
+class FuzzyKeyIndex:
+    """
+    Near-miss GRP or PCN lookup within a BIN block, for O/0 swaps, dropped leading zeros and
+    truncated IDs. Deletion-neighbourhood index (as in SymSpell): two values within edit distance d
+    always share a string reachable by at most d deletions from each, so candidates come from an
+    exact join on (BIN, deletion variant) and only those get a real Levenshtein check --
+    never all pairs. Values shorter than `min_length` are left out (too many accidental neighbours).
+    """
+
+    def __init__(self, bins, values, codes, max_distance=1, min_length=4):
+        self.max_distance = max_distance
+        self.min_length = min_length
+        entries, kept = self._pairs(bins, values)
+        entries['code'] = np.asarray(codes)[kept]
+        self.entries = entries.drop_duplicates(['bin', 'value']).reset_index(drop=True)
+        self.variants = self._variants(self.entries)
+
+    @classmethod
+    def from_tables(cls, entries, variants, max_distance, min_length):
+        """Reassemble an index from its saved entries/variants tables (see index_store)."""
+        index = cls.__new__(cls)
+        index.max_distance, index.min_length = max_distance, min_length
+        index.entries, index.variants = entries, variants
+        return index
+
+    def _pairs(self, bins, values):
+        """(bin, value) of the rows that can take part (both present, value long enough), and those rows' positions."""
+        frame = pd.DataFrame({'bin': pd.Series(bins).to_numpy(), 'value': pd.Series(values).astype(object).to_numpy()})
+        present = frame['bin'].notna().to_numpy() & frame['value'].notna().to_numpy()
+        present[present] = frame['value'][present].str.len().to_numpy() >= self.min_length
+        kept = np.flatnonzero(present)
+        frame = frame.iloc[kept].reset_index(drop=True)
+        frame['bin'] = frame['bin'].astype(np.int64)
+        frame['value'] = frame['value'].astype(str)
+        return frame, kept
+
+    def _variants(self, frame):
+        return pd.DataFrame(
+            [(b, variant, i) for i, (b, value) in enumerate(zip(frame['bin'], frame['value']))
+             for variant in deletion_variants(value, self.max_distance)],
+            columns=['bin', 'variant', '_id'],
+        ).astype({'bin': np.int64, '_id': np.int64})
+
+    def lookup(self, bins, values):
+        """
+        Closest extracted values in the same BIN, within max_distance, for each (BIN, value) row.
+        Returns (_pos, _key, _distance): the row's position, the key code (BIN_GRP or BIN_PCN) of a
+        near-miss extracted value, and its edit distance. Ties at the smallest distance all come back;
+        rows without a near miss are absent.
+        """
+        queries, kept = self._pairs(bins, values)
+        queries['_pos'] = kept
+        unique = queries.drop_duplicates(['bin', 'value']).reset_index(drop=True)
+        empty = pd.DataFrame({'_pos': [], '_key': [], '_distance': []}).astype(
+            {'_pos': np.int64, '_key': np.int64, '_distance': np.int8})
+        if unique.empty:
+            return empty
+
+        candidates = self._variants(unique).merge(self.variants, on=['bin', 'variant'], suffixes=('_q', '_e'))
+        candidates = candidates[['_id_q', '_id_e']].drop_duplicates()
+        query_values = unique['value'].to_numpy()[candidates['_id_q'].to_numpy()]
+        entry_values = self.entries['value'].to_numpy()[candidates['_id_e'].to_numpy()]
+        candidates['_distance'] = [
+            Levenshtein.distance(a, b, score_cutoff=self.max_distance) for a, b in zip(query_values, entry_values)
+        ]
+        candidates = candidates[candidates['_distance'] <= self.max_distance]
+        candidates = candidates[candidates['_distance'] == candidates.groupby('_id_q')['_distance'].transform('min')]
+        if candidates.empty:
+            return empty
+
+        ids = unique[['bin', 'value']].assign(_id_q=np.arange(len(unique)))
+        hits = queries.merge(ids, on=['bin', 'value']).merge(candidates, on='_id_q')
+        return pd.DataFrame({
+            '_pos': hits['_pos'].to_numpy(dtype=np.int64),
+            '_key': self.entries['code'].to_numpy()[hits['_id_e'].to_numpy()],
+            '_distance': hits['_distance'].to_numpy(dtype=np.int8),
+        })
@@ -0,0 +1,107 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from cascade_join import CascadeIndex
+from fuzzy_keys import FuzzyKeyIndex
+from pair_store import parquet_safe
+
+# Layout of a saved extracted-side index directory:
+#   meta.json                    fingerprint, level names, fuzzy settings
+#   table.parquet                the extracted rows (CascadeIndex.table)
+#   postings_<column>.npy        CascadeIndex.postings, one array per column (memory-mapped on load)
+#   rank.npy                     CascadeIndex.rank (memory-mapped on load)
+#   <level>_entries.parquet      FuzzyKeyIndex tables per fuzzy level that is on
+#   <level>_variants.parquet     (fuzzy_grp_entries.parquet, fuzzy_pcn_variants.parquet, ...)
+# Bump when the key codes or the layout change, so older saved indexes get rebuilt
+INDEX_VERSION = 2
+META_FILE = 'meta.json'
+TABLE_FILE = 'table.parquet'
+POSTING_COLUMNS = ['_level', '_key', '_right_pos']
+
+
+def source_fingerprint(path, **settings):
+    """
+    sha256 of the source file's bytes plus the settings the index was built with. Hashing a
+    workbook takes milliseconds; parsing it with read_excel is the slow part the saved index skips.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(json.dumps({'version': INDEX_VERSION, **settings}, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def saved_fingerprint(index_dir):
+    """Fingerprint of the index saved in `index_dir`, or None when there is none."""
+    try:
+        with open(os.path.join(index_dir, META_FILE), encoding='utf-8') as f:
+            return json.load(f).get('fingerprint')
+    except (OSError, ValueError):
+        return None
+
+
+def save_index(index, index_dir, fingerprint):
+    """Write `index` to `index_dir` (replacing any saved index); written to `<index_dir>.tmp` first."""
+    index_dir = index_dir.rstrip('/\\')
+    tmp_dir = index_dir + '.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    parquet_safe(index.table).to_parquet(os.path.join(tmp_dir, TABLE_FILE), index=False)
+    for col in POSTING_COLUMNS:
+        np.save(os.path.join(tmp_dir, f'postings{col}.npy'), index.postings[col].to_numpy())
+    np.save(os.path.join(tmp_dir, 'rank.npy'), np.asarray(index.rank))
+    fuzzy = {}
+    for level, fuzzy_index in index.fuzzy.items():
+        fuzzy_index.entries.to_parquet(os.path.join(tmp_dir, f'{level.lower()}_entries.parquet'), index=False)
+        fuzzy_index.variants.to_parquet(os.path.join(tmp_dir, f'{level.lower()}_variants.parquet'), index=False)
+        fuzzy[level] = {'max_distance': fuzzy_index.max_distance, 'min_length': fuzzy_index.min_length}
+    # meta.json last: a directory without it is never taken for a complete index
+    with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'fingerprint': fingerprint, 'levels': index.levels,
+                   'rows': len(index.table), 'fuzzy': fuzzy}, f, indent=2)
+
+    if os.path.exists(index_dir):
+        shutil.rmtree(index_dir)
+    os.replace(tmp_dir, index_dir)
+
+
+def load_index(index_dir):
+    """The CascadeIndex saved in `index_dir`; the postings and rank arrays are memory-mapped, not read."""
+    with open(os.path.join(index_dir, META_FILE), encoding='utf-8') as f:
+        meta = json.load(f)
+    postings = pd.DataFrame({
+        col: np.load(os.path.join(index_dir, f'postings{col}.npy'), mmap_mode='r') for col in POSTING_COLUMNS
+    })
+    fuzzy = {
+        level: FuzzyKeyIndex.from_tables(
+            pd.read_parquet(os.path.join(index_dir, f'{level.lower()}_entries.parquet')),
+            pd.read_parquet(os.path.join(index_dir, f'{level.lower()}_variants.parquet')),
+            **settings,
+        )
+        for level, settings in meta['fuzzy'].items()
+    }
+    return CascadeIndex.from_parts(
+        pd.read_parquet(os.path.join(index_dir, TABLE_FILE)),
+        meta['levels'],
+        postings,
+        np.load(os.path.join(index_dir, 'rank.npy'), mmap_mode='r'),
+        fuzzy,
+    )
+
+
+def open_index(index_dir, fingerprint, build, rebuild=False):
+    """
+    The index saved in `index_dir` if it was built from the same fingerprint; otherwise (or with
+    rebuild=True) a fresh one from `build()`, saved for the next run. Returns (index, was_built).
+    """
+    if not rebuild and saved_fingerprint(index_dir) == fingerprint:
+        return load_index(index_dir), False
+    index = build()
+    save_index(index, index_dir, fingerprint)
+    return index, True
@@ -1,130 +1,166 @@
+import time
 import pandas as pd
-import numpy as np
+from cascade_keys import format_bin_column, add_match_keys, drop_match_keys
+from cascade_join import CascadeIndex, check_fanout, estimate_fanout, iter_join_chunks
+from match_summary import MatchSummary
+from index_store import source_fingerprint, open_index
 
 # --- CONFIGURATION ---
 file_path = 'payer_data_020725_test.xlsx'
+# Workbook with the Key+extracted sheet (None = file_path). Keep it in its own workbook to reuse
+# one saved index across top-N lists: the saved index is rebuilt whenever this file changes
+extracted_path = None
+# Saved extracted-side index (see index_store.py; build_extracted_index.py builds it up front).
+# Loaded instead of re-reading Key+extracted when the workbook and index settings are unchanged
+# (None = always rebuild in memory)
+INDEX_DIR = 'extracted_index'
 output_path = 'merged_output_BPG_fallback_cascade_batchwiseX1.csv'
-
-# Load df2
-df2 = pd.read_excel(file_path, sheet_name='Key+top10k')
-df2['_original_index'] = df2.index
-
-# Create chunk list
+# 'csv':   one wide CSV, every matched row carrying all columns of both sheets (output_path)
+# 'pairs': a pair store directory (pairs_path): slim (top_row_id, extracted_row_id) Parquet pairs
+#          partitioned by Matched_Level, plus each sheet once; pair_store.load_wide rebuilds the wide rows
+OUTPUT_FORMAT = 'csv'
+pairs_path = 'merged_output_BPG_fallback_cascade_pairs'
+# Per-BPG match counts and rules used, gathered while the join runs (None = skip)
+summary_path = 'summary_match_counts_BPG_finalX.csv'
+SUMMARY_KEY = 'BPG_top10k'
 chunk_size = 1000
-df2_chunks = np.array_split(df2, max(1, len(df2) // chunk_size + 1))
-
-# Load df1
-df1 = pd.read_excel(file_path, sheet_name='Key+extracted')
-
-# Function to format BIN values with leading zeros to ensure they are 6 digits
-def format_bin(value):
-    if pd.notna(value):
-        value = str(value).split('.')[0]  # Remove any decimals
-        return value.zfill(6)  # Pad with leading zeros to make it 6 characters
-    return None
-
-# Apply consistent formatting to BIN columns
-df2['BIN_top10k'] = df2['BIN_top10k'].apply(format_bin)
-df1['BIN_extracted'] = df1['BIN_extracted'].apply(format_bin)
-
-# Sanitize df1 join columns
-for col in ['BIN_extracted', 'PCN_extracted', 'GRP_extracted']:
-    if col in df1.columns:
-        df1[col] = df1[col].fillna('NULL').astype(str).str.strip()
-
-# Function to generate match keys with proper BIN formatting
-def generate_match_keys(row, bin_col, pcn_col, grp_col):
-    bin_val = format_bin(row[bin_col]) if pd.notna(row[bin_col]) else None
-    pcn_val = str(row[pcn_col]).strip() if pd.notna(row[pcn_col]) else None
-    grp_val = str(row[grp_col]).strip() if pd.notna(row[grp_col]) else None
-
-    match_keys = {
-        'BPG': f"{bin_val}_{pcn_val}_{grp_val}" if bin_val and pcn_val and grp_val else None,
-        'BIN_GRP': f"{bin_val}_{grp_val}" if bin_val and grp_val else None,
-        'GRP': grp_val if grp_val else None,
-        'BIN_PCN': f"{bin_val}_{pcn_val}" if bin_val and pcn_val else None,
-        'BIN': bin_val if bin_val else None
-    }
-    return match_keys
-
-def process_chunk(df2_chunk, df1, row_offset):
-    df2_chunk = df2_chunk.copy()
-    df2_chunk['_row_id'] = range(row_offset, row_offset + len(df2_chunk))
-
-    # Generate match keys for df2_chunk using top10k columns
-    df2_chunk['match_keys'] = df2_chunk.apply(generate_match_keys, axis=1,
-                                               args=('BIN_top10k', 'PCN_top10k', 'GRP_top10k'))
-
-    # Generate match keys for df1 using extracted columns
-    df1['match_keys'] = df1.apply(generate_match_keys, axis=1,
-                                  args=('BIN_extracted', 'PCN_extracted', 'GRP_extracted'))
-
-    all_matches = []
-    matched_row_ids = set()
-
-    # Define the matching cascade levels
-    levels = [
-        ('BPG', 'BPG'),
-        ('BIN_GRP', 'BIN+GRP'),
-        ('GRP', 'GRP'),
-        ('BIN_PCN', 'BIN+PCN'),
-        ('BIN', 'BIN')
-    ]
-
-    for level, key in levels:
-        df2_unmatched_now = df2_chunk[~df2_chunk['_row_id'].isin(matched_row_ids)]
-        if df2_unmatched_now.empty:
-            break
-
-        key_mask = df2_unmatched_now['match_keys'].apply(lambda x: x.get(key) is not None)
-        df2_unmatched_with_key = df2_unmatched_now[key_mask]
-
-        if df2_unmatched_with_key.empty:
-            continue
-
-        df1_filtered = df1[df1['match_keys'].apply(lambda x: x.get(key) is not None)]
-
-        # Debugging: Print keys and filtered DataFrames
-        print(f"Level: {level}")
-        print("df2_unmatched_with_key:")
-        print(df2_unmatched_with_key[['_row_id', 'match_keys']])
-        print("df1_filtered:")
-        print(df1_filtered[['BIN_extracted', 'PCN_extracted', 'GRP_extracted', 'match_keys']])
-
-        # Create a temporary column for the key used in merge
-        df2_unmatched_with_key['key_for_merge'] = df2_unmatched_with_key['match_keys'].apply(lambda x: x.get(key))
-        df1_filtered['key_for_merge'] = df1_filtered['match_keys'].apply(lambda x: x.get(key))
-
-        # Perform merge
-        merged = df2_unmatched_with_key.merge(
-            df1_filtered,
-            how='inner',
-            left_on='key_for_merge',
-            right_on='key_for_merge',
-            suffixes=('', '_matched')
-        )
-        if not merged.empty:
-            merged['Matched_Level'] = level
-            all_matches.append(merged)
-            matched_row_ids.update(merged['_row_id'].unique())
-
-    # Handle unmatched rows
-    final_unmatched = df2_chunk[~df2_chunk['_row_id'].isin(matched_row_ids)]
-    if not final_unmatched.empty:
-        final_unmatched['Matched_Level'] = 'Unmatched'
-        all_matches.append(final_unmatched)
-
-    return pd.concat(all_matches, ignore_index=True)
-
-# Process all chunks
-first_chunk = True
-global_row_offset = 0
-for chunk_num, df2_chunk in enumerate(df2_chunks, start=1):
-    print(f"🔄 Processing chunk {chunk_num}...")
-    chunk_result = process_chunk(df2_chunk, df1, global_row_offset)
-    global_row_offset += len(df2_chunk)
-    chunk_result.to_csv(output_path, index=False, mode='w' if first_chunk else 'a', header=first_chunk)
-    first_chunk = False
-    print(f"✅ Chunk {chunk_num} saved with {len(chunk_result)} rows.")
-
-print(f"\n✅ All chunks processed. Final output saved to:\n{output_path}")
+# Worker processes for the join (None = all cores, 1 = no pool)
+WORKERS = None
+# Print per-level match counts for every chunk
+DEBUG = False
+# Fan-out per cascade level (levels not listed keep every match):
+#   ('cap', k)        keep the k best-ranked extracted rows per top10k row
+#   ('aggregate', n)  keep one row per top10k row, plus Match_Count and a sample of n SAMPLE_COLUMN values
+# e.g. {'GRP': ('cap', 50), 'BIN': ('aggregate', 5)} -- a common BIN like 610014 matches thousands of rows
+FANOUT = {}
+# Tie-breaker for capped/aggregated levels: extracted columns to rank by (None = extracted file order)
+RANK_BY = None
+RANK_ASCENDING = True
+SAMPLE_COLUMN = 'Plan Name/Group Name'
+# Warn before the join if the estimated output is bigger than this
+WARN_OUTPUT_ROWS = 50_000_000
+# Fuzzy GRP level (FUZZY_GRP): same BIN, GRP within this many edits -- catches O/0 swaps, dropped
+# leading zeros and truncated group IDs. Output gets a Fuzzy_Distance column. 0 = off
+FUZZY_MAX_DISTANCE = 0
+# GRPs/PCNs shorter than this never fuzzy-match (short IDs have too many accidental neighbours)
+FUZZY_MIN_LENGTH = 4
+# Level the fuzzy GRP level is tried after. It has to come before BIN_PCN/BIN: once the BIN alone
+# exists on the extracted side, those exact levels take the row and a later fuzzy level never fires
+FUZZY_AFTER = 'GRP'
+# Fuzzy PCN level (FUZZY_PCN): same BIN, PCN within this many edits, tried right after BIN_PCN
+# (before BIN, for the same reason as above). Also fills Fuzzy_Distance. 0 = off
+FUZZY_PCN_MAX_DISTANCE = 0
+
+
+def index_settings():
+    """Everything besides the Key+extracted data that changes the index; part of its fingerprint."""
+    return {'sheet': 'Key+extracted', 'rank_by': RANK_BY, 'rank_ascending': RANK_ASCENDING,
+            'fuzzy_distance': FUZZY_MAX_DISTANCE, 'fuzzy_min_length': FUZZY_MIN_LENGTH, 'fuzzy_after': FUZZY_AFTER,
+            'fuzzy_pcn_distance': FUZZY_PCN_MAX_DISTANCE}
+
+
+def fuzzy_on():
+    """Whether any fuzzy level is on (they need the compact BIN/PCN/GRP values on both sides)."""
+    return FUZZY_MAX_DISTANCE > 0 or FUZZY_PCN_MAX_DISTANCE > 0
+
+
+def build_index():
+    """Read Key+extracted and build its cascade index (key codes for every level, postings, ranks)."""
+    df1 = pd.read_excel(extracted_path or file_path, sheet_name='Key+extracted')
+    df1['BIN_extracted'] = format_bin_column(df1['BIN_extracted'])
+    df1 = add_match_keys(df1, 'BIN_extracted', 'PCN_extracted', 'GRP_extracted', keep_parts=fuzzy_on())
+
+    # Sanitize df1 join columns
+    for col in ['BIN_extracted', 'PCN_extracted', 'GRP_extracted']:
+        if col in df1.columns:
+            df1[col] = df1[col].fillna('NULL').astype(str).str.strip()
+
+    return CascadeIndex(
+        df1, rank_by=RANK_BY, ascending=RANK_ASCENDING,
+        fuzzy_distance=FUZZY_MAX_DISTANCE, fuzzy_min_length=FUZZY_MIN_LENGTH, fuzzy_after=FUZZY_AFTER,
+        fuzzy_pcn_distance=FUZZY_PCN_MAX_DISTANCE
+    )
+
+
+def load_index(rebuild=False):
+    """The extracted-side index: from INDEX_DIR when its fingerprint still matches, else built (and saved)."""
+    if not INDEX_DIR:
+        return build_index()
+    fingerprint = source_fingerprint(extracted_path or file_path, **index_settings())
+    index, built = open_index(INDEX_DIR, fingerprint, build_index, rebuild=rebuild)
+    if built:
+        print(f"✅ Extracted index built and saved to: {INDEX_DIR}")
+    else:
+        print(f"✅ Extracted index loaded from: {INDEX_DIR} ({len(index.table)} rows)")
+    return index
+
+
+def main():
+    if OUTPUT_FORMAT not in ('csv', 'pairs'):
+        raise ValueError(f"❌ Unknown OUTPUT_FORMAT '{OUTPUT_FORMAT}'. Use 'csv' or 'pairs'.")
+    start_time = time.perf_counter()
+
+    # Load df2
+    df2 = pd.read_excel(file_path, sheet_name='Key+top10k')
+    df2['_original_index'] = df2.index
+
+    # Apply consistent formatting to BIN columns (zero-padded to 6 digits)
+    df2['BIN_top10k'] = format_bin_column(df2['BIN_top10k'])
+
+    # Match keys for all five cascade levels, computed once per side as int64 hash codes
+    # (rows missing a part of a level's key get NULL_KEY and never match at that level);
+    # the fuzzy levels also need the compact BIN/PCN/GRP values themselves
+    df2 = add_match_keys(df2, 'BIN_top10k', 'PCN_top10k', 'GRP_top10k', keep_parts=fuzzy_on())
+    df2['_row_id'] = range(len(df2))
+
+    # Extracted-side key indexes, built (or loaded from INDEX_DIR) once and shared read-only with every worker
+    fanout = check_fanout(FANOUT)
+    index = load_index()
+
+    # Output size per level, known exactly before anything is joined
+    estimate = estimate_fanout(df2, index, fanout)
+    print(estimate.to_string(index=False))
+    total_rows = int(estimate['Output Rows'].sum())
+    if total_rows > WARN_OUTPUT_ROWS:
+        print(f"⚠️ This run will write {total_rows:,} rows (more than {WARN_OUTPUT_ROWS:,}). "
+              f"Consider capping or aggregating the GRP/BIN levels in FANOUT.")
+    else:
+        print(f"✅ Estimated output: {total_rows:,} rows.")
+
+    # Chunks are joined in parallel and written in chunk order as they complete
+    summary = MatchSummary()
+    chunks = iter_join_chunks(
+        df2, index, chunk_size, workers=WORKERS, output=OUTPUT_FORMAT,
+        summary_key=SUMMARY_KEY if summary_path else None,
+        fanout=fanout, sample_column=SAMPLE_COLUMN, debug=DEBUG
+    )
+    if OUTPUT_FORMAT == 'pairs':
+        from pair_store import PairWriter
+        writer = PairWriter(pairs_path)
+        writer.write_sides(drop_match_keys(df2), index.table)
+        for chunk_num, rows, pairs, matches in chunks:
+            writer.write_pairs(pairs)
+            if matches is not None:
+                summary.add(matches['key'], matches['rule'], matches['matches'])
+            print(f"✅ Chunk {chunk_num} saved with {rows} rows.")
+        writer.close()
+        saved_to = pairs_path
+    else:
+        with open(output_path, 'w', newline='', encoding='utf-8') as out:
+            for chunk_num, rows, csv_text, matches in chunks:
+                out.write(csv_text)
+                if matches is not None:
+                    summary.add(matches['key'], matches['rule'], matches['matches'])
+                print(f"✅ Chunk {chunk_num} saved with {rows} rows.")
+        saved_to = output_path
+
+    print(f"\n✅ All chunks processed in {time.perf_counter() - start_time:.1f}s. Final output saved to:\n{saved_to}")
+
+    # One summary row per top10k row, in top10k order
+    if summary_path:
+        summary.table(df2[SUMMARY_KEY], SUMMARY_KEY).to_csv(summary_path, index=False)
+        print(f"✅ Summary saved to: {summary_path}")
+
+
+if __name__ == '__main__':
+    main()
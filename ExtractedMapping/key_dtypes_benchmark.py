@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+from bpg_keys import normalize_keys, level_codes
+
+# --- CONFIGURATION ---
+file_path = 'payer_data_020725_test.xlsx'
+# Top10k rows are resampled up to this many to get measurable timings (0 = use as-is)
+N_ROWS = 2_000_000
+SEED = 42
+
+
+# --- OLD REPRESENTATION: per-value format_bin, object strings with 'NULL' sentinels ---
+def format_bin(value):
+    if pd.notna(value):
+        value = str(value).split('.')[0]
+        return value.zfill(6)
+    return None
+
+
+def legacy_keys(df, bin_col, pcn_col, grp_col):
+    return pd.DataFrame({
+        'BIN': df[bin_col].apply(format_bin).fillna('NULL').astype(str).str.strip(),
+        'PCN': df[pcn_col].fillna('NULL').astype(str).str.strip(),
+        'GRP': df[grp_col].fillna('NULL').astype(str).str.strip(),
+    })
+
+
+def legacy_bpg(keys):
+    return keys['BIN'] + '_' + keys['PCN'] + '_' + keys['GRP']
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True, index=False).sum() / 1e6
+
+
+# --- LOAD DATA ---
+print("Reading Excel file...")
+top10k = pd.read_excel(file_path, sheet_name='Key+top10k')
+extracted = pd.read_excel(file_path, sheet_name='Key+extracted')
+if N_ROWS:
+    rng = np.random.default_rng(SEED)
+    top10k = top10k.iloc[rng.integers(len(top10k), size=N_ROWS)].reset_index(drop=True)
+print(f"{len(top10k)} top10k rows x {len(extracted)} extracted rows")
+
+# --- RUN ---
+old_top, old_norm = timed(legacy_keys, top10k, 'BIN_top10k', 'PCN_top10k', 'GRP_top10k')
+new_top, new_norm = timed(normalize_keys, top10k, 'BIN_top10k', 'PCN_top10k', 'GRP_top10k')
+old_extracted = legacy_keys(extracted, 'BIN_extracted', 'PCN_extracted', 'GRP_extracted')
+new_extracted = normalize_keys(extracted, 'BIN_extracted', 'PCN_extracted', 'GRP_extracted')
+
+old_bpg, old_build = timed(legacy_bpg, old_top)
+new_bpg, new_build = timed(level_codes, new_top, ('BIN', 'PCN', 'GRP'))
+old_extracted_bpg = legacy_bpg(old_extracted)
+new_extracted_bpg = level_codes(new_extracted, ('BIN', 'PCN', 'GRP'))
+
+# "Does this BPG exist on the extracted side?" -- the comparison every cascade level makes
+old_hits, old_lookup = timed(lambda: old_bpg.isin(old_extracted_bpg).to_numpy() & ~old_bpg.str.contains('NULL').to_numpy())
+new_hits, new_lookup = timed(lambda: (new_bpg != -1) & np.isin(new_bpg, new_extracted_bpg[new_extracted_bpg != -1]))
+
+rows = [
+    {"Step": "Normalize BIN/PCN/GRP (s)", "Object strings": old_norm, "Compact": new_norm},
+    {"Step": "Key columns in memory (MB)", "Object strings": memory_mb(old_top), "Compact": memory_mb(new_top)},
+    {"Step": "Build BPG keys (s)", "Object strings": old_build, "Compact": new_build},
+    {"Step": "BPG keys in memory (MB)", "Object strings": memory_mb(old_bpg.to_frame()), "Compact": new_bpg.nbytes / 1e6},
+    {"Step": "BPG lookup vs extracted (s)", "Object strings": old_lookup, "Compact": new_lookup},
+]
+result = pd.DataFrame(rows)
+result["Ratio"] = result["Object strings"] / result["Compact"]
+print()
+print(result.round(2).to_string(index=False))
+
+print(f"\nBPG hits: {int(old_hits.sum())} (object strings) vs {int(new_hits.sum())} (compact)")
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+NO_MATCH = 'No Match'
+RULE_COLUMNS = ['Matched_Level', 'rule_applied', 'rule_used']
+
+
+class MatchSummary:
+    """
+    Per-key match counts and the set of rules (Matched_Level values) that matched, accumulated
+    one chunk at a time, so the summary never needs the whole join output in memory.
+    """
+
+    def __init__(self):
+        self.match_counts = {}
+        self.rules_used = {}
+
+    def add(self, keys, rules, matches=1):
+        """One entry per row: its key, its rule, and how many matches it stands for. Unmatched rows are skipped."""
+        part = pd.DataFrame({'key': keys, 'rule': rules, 'matches': matches})
+        part = part[part['rule'].notna() & ~part['rule'].isin(['Unmatched', NO_MATCH])]
+        for (key, rule), count in part.groupby(['key', 'rule'])['matches'].sum().items():
+            self.match_counts[key] = self.match_counts.get(key, 0) + int(count)
+            self.rules_used.setdefault(key, set()).add(rule)
+
+    def table(self, keys, key_column):
+        """One row per entry of `keys` (in that order): key, Match_Count, Rules_Used ('No Match' when none)."""
+        keys = pd.Series(keys).reset_index(drop=True)
+        rules_used = {key: ', '.join(sorted(rules)) for key, rules in self.rules_used.items()}
+        return pd.DataFrame({
+            key_column: keys,
+            'Match_Count': keys.map(self.match_counts).fillna(0).astype(int),
+            'Rules_Used': keys.map(rules_used).fillna(NO_MATCH),
+        })
+
+
+def pair_matches(pairs, keys):
+    """
+    (key, rule, matches) per matched top10k row of one cascade_pairs table; `keys` holds the
+    summary key of each left row, by _left_pos. Under fan-out policies a row's matches come from
+    Match_Count (its total before capping/aggregating); otherwise it is the row's number of pairs.
+    """
+    matched = pairs[pairs['_right_pos'].to_numpy() >= 0]
+    per_row = matched.groupby('_left_pos', sort=False)
+    matches = per_row['Match_Count'].first() if 'Match_Count' in matched.columns else per_row.size()
+    return pd.DataFrame({
+        'key': np.asarray(keys, dtype=object)[matches.index.to_numpy()],
+        'rule': per_row['Matched_Level'].first().to_numpy(),
+        'matches': matches.to_numpy(),
+    })
+
+
+def summarize_csv(path, key_column, chunksize=200_000):
+    """
+    MatchSummary of an existing wide join CSV, read `chunksize` rows at a time and only the
+    columns it needs. Keys are read as text. If the CSV has Match_Count and _row_id
+    (fan-out policies), each top10k row counts its Match_Count once.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    rule_column = next((col for col in RULE_COLUMNS if col in header), None)
+    if not rule_column:
+        raise ValueError("❌ No rule match column found. Please ensure your join script includes rule name per match.")
+    with_counts = 'Match_Count' in header and '_row_id' in header
+    usecols = [key_column, rule_column] + (['_row_id', 'Match_Count'] if with_counts else [])
+
+    summary = MatchSummary()
+    last_row_id = None
+    for chunk in pd.read_csv(path, usecols=usecols, dtype={key_column: str}, chunksize=chunksize):
+        if with_counts:
+            # A top10k row's output rows are contiguous but may straddle two reads
+            row_ids = chunk['_row_id'].to_numpy()
+            first = np.r_[row_ids[:1] != last_row_id, row_ids[1:] != row_ids[:-1]]
+            last_row_id = row_ids[-1] if len(row_ids) else last_row_id
+            chunk = chunk[first]
+            summary.add(chunk[key_column].to_numpy(), chunk[rule_column].to_numpy(), chunk['Match_Count'].to_numpy())
+        else:
+            summary.add(chunk[key_column].to_numpy(), chunk[rule_column].to_numpy())
+    return summary
@@ -0,0 +1,116 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from cascade_join import widen_pairs
+
+# Layout of a pair store directory:
+#   top10k.parquet                              every top10k row once, with top_row_id
+#   extracted.parquet                           every extracted row once, with extracted_row_id
+#   pairs/Matched_Level=<level>/part-0.parquet  (top_row_id, extracted_row_id, Fuzzy_Distance/Match_* columns)
+# Row ids are row positions in the side tables; extracted_row_id is null for unmatched rows.
+TOP_ID = 'top_row_id'
+EXTRACTED_ID = 'extracted_row_id'
+TOP_FILE = 'top10k.parquet'
+EXTRACTED_FILE = 'extracted.parquet'
+PAIRS_DIR = 'pairs'
+LEVEL_PARTITION = 'Matched_Level'
+# Optional cascade_pairs columns kept in the pair files, when the join produced them
+PAIR_EXTRAS = {'Fuzzy_Distance': pa.int8(), 'Match_Count': pa.int64(), 'Match_Sample': pa.string()}
+
+
+def parquet_safe(df):
+    """Object columns holding mixed Python types (numbers and text read from Excel) as strings; missing stays missing."""
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        values = df[col]
+        present = values.notna()
+        if not values[present].map(type).eq(str).all():
+            df[col] = values.astype(str).where(present)
+    return df
+
+
+class PairWriter:
+    """
+    Write a cascade join as a pair store (see the layout above) instead of one wide CSV.
+    Everything goes to `<out_dir>.tmp` first; close() moves it into place so a failed run
+    never leaves a partial output. An existing pair store at `out_dir` is replaced.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir.rstrip('/\\')
+        if os.path.exists(self.out_dir) and not os.path.isdir(os.path.join(self.out_dir, PAIRS_DIR)):
+            raise ValueError(f"❌ {self.out_dir} exists and is not a pair store; refusing to replace it.")
+        self.tmp_dir = self.out_dir + '.tmp'
+        if os.path.exists(self.tmp_dir):
+            shutil.rmtree(self.tmp_dir)
+        os.makedirs(os.path.join(self.tmp_dir, PAIRS_DIR))
+        self.rows = 0
+        self._schema = None
+        self._writers = {}
+
+    def write_sides(self, top, extracted):
+        for name, table, id_column in [(TOP_FILE, top, TOP_ID), (EXTRACTED_FILE, extracted, EXTRACTED_ID)]:
+            table = parquet_safe(table.reset_index(drop=True))
+            table.insert(0, id_column, np.arange(len(table), dtype=np.int64))
+            table.to_parquet(os.path.join(self.tmp_dir, name), index=False)
+
+    def write_pairs(self, pairs):
+        """Append one cascade_pairs table (with _left_pos over the whole top10k table) to its level partitions."""
+        right_pos = pairs['_right_pos'].to_numpy()
+        slim = pd.DataFrame({
+            TOP_ID: pairs['_left_pos'].to_numpy(dtype=np.int64),
+            EXTRACTED_ID: pd.array(right_pos, dtype='Int64'),
+        })
+        slim.loc[right_pos < 0, EXTRACTED_ID] = pd.NA
+        for col in pairs.columns:
+            if col in PAIR_EXTRAS:
+                slim[col] = pairs[col].array
+
+        if self._schema is None:
+            types = {TOP_ID: pa.int64(), EXTRACTED_ID: pa.int64(), **PAIR_EXTRAS}
+            self._schema = pa.schema([(col, types[col]) for col in slim.columns])
+        for level, part in slim.groupby(pairs['Matched_Level'].to_numpy(), sort=False):
+            if level not in self._writers:
+                level_dir = os.path.join(self.tmp_dir, PAIRS_DIR, f'{LEVEL_PARTITION}={level}')
+                os.makedirs(level_dir)
+                self._writers[level] = pq.ParquetWriter(os.path.join(level_dir, 'part-0.parquet'), self._schema)
+            self._writers[level].write_table(pa.Table.from_pandas(part, schema=self._schema, preserve_index=False))
+        self.rows += len(slim)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        os.replace(self.tmp_dir, self.out_dir)
+
+
+def load_pairs(out_dir, levels=None):
+    """The slim pair table, ordered by top10k row. `levels` reads only those Matched_Level partitions."""
+    filters = [(LEVEL_PARTITION, 'in', list(levels))] if levels else None
+    pairs = pd.read_parquet(os.path.join(out_dir, PAIRS_DIR), filters=filters)
+    pairs[LEVEL_PARTITION] = pairs[LEVEL_PARTITION].astype(str)
+    pairs[EXTRACTED_ID] = pairs[EXTRACTED_ID].astype('Int64')
+    if 'Fuzzy_Distance' in pairs.columns:
+        pairs['Fuzzy_Distance'] = pairs['Fuzzy_Distance'].astype('Int8')
+    return pairs.sort_values(TOP_ID, kind='stable').reset_index(drop=True)
+
+
+def load_wide(out_dir, levels=None):
+    """
+    Rebuild the wide join output (the same columns as the CSV output) from a pair store:
+    matched rows in top10k row order, then the unmatched ones.
+    `levels` limits it to some Matched_Level partitions; only those pair files are read.
+    """
+    pairs = load_pairs(out_dir, levels)
+    top = pd.read_parquet(os.path.join(out_dir, TOP_FILE)).drop(columns=TOP_ID)
+    extracted = pd.read_parquet(os.path.join(out_dir, EXTRACTED_FILE)).drop(columns=EXTRACTED_ID)
+    pairs = pd.DataFrame({
+        '_left_pos': pairs[TOP_ID].to_numpy(),
+        '_right_pos': pairs[EXTRACTED_ID].fillna(-1).to_numpy(dtype=np.int64),
+        **{col: pairs[col] for col in [LEVEL_PARTITION] + [c for c in PAIR_EXTRAS if c in pairs.columns]},
+    })
+    return widen_pairs(top, extracted, pairs)
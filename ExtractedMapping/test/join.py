@@ -1,118 +1,117 @@
-import pandas as pd
 import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'code'))
+from bpg_keys import normalize_keys, format_bin
+
+# Streaming "first level wins" match: every top10k row gets the extracted rows of the first level
+# below whose key exists on the extracted side (all of that level's matches), or one
+# 'No match found' row. Levels are looked up in per-level dict indexes built once from extracted.
 
 # === CONFIG ===
 top10k_file = 'payer_data_020725_test.xlsx'
 sheet_top10k = 'Key+top10k'
 sheet_extracted = 'Key+extracted'
-chunk_size = 10
+chunk_size = 1000
 output_csv = 'top10k_matches_streamed.csv'
 
-# === CLEAN SETUP ===
-if os.path.exists(output_csv):
-    os.remove(output_csv)
-
-# === LOAD extracted FULLY ===
-extracted = pd.read_excel(top10k_file, sheet_name=sheet_extracted)
-
-# Ensure string types for matching columns
-for col in ['BIN_extracted', 'PCN_extracted', 'GRP_extracted']:
-    extracted[col] = extracted[col].astype(str).fillna('').str.zfill(6 if 'BIN' in col else 0)
-
-# === LOAD top10k FULLY ===
-top10k = pd.read_excel(top10k_file, sheet_name=sheet_top10k)
-
-# Ensure string types for matching columns
-for col in ['BIN_top10k', 'PCN_top10k', 'GRP_top10k']:
-    top10k[col] = top10k[col].astype(str).fillna('').str.zfill(6 if 'BIN' in col else 0)
-
-# === DEFINE MATCH LEVELS ===
-def get_match_levels(BIN, PCN, GRP):
-    levels = []
-    if BIN and PCN and GRP:
-        levels.append(('BIN+PCN+GRP', (BIN, PCN, GRP)))
-    if BIN and GRP:
-        levels.append(('BIN+GRP', (BIN, GRP)))
-    if GRP:
-        levels.append(('GRP', (GRP,)))
-    if BIN and PCN:
-        levels.append(('BIN+PCN', (BIN, PCN)))
-    if BIN:
-        levels.append(('BIN', (BIN,)))
-    return levels
-
-# === PROCESS IN CHUNKS ===
-row_offset = 0
-for start in range(0, len(top10k), chunk_size):
-    chunk = top10k.iloc[start:start + chunk_size].copy()
-    chunk_matches = []
-
-    for i, row in chunk.iterrows():
-        index = row_offset + i
-        BIN = row['BIN_top10k']
-        PCN = row['PCN_top10k']
-        GRP = row['GRP_top10k']
-        matched = False
-
-        for level, keys in get_match_levels(BIN, PCN, GRP):
-            if level == 'BIN+PCN+GRP':
-                match_df = extracted[
-                    (extracted['BIN_extracted'] == keys[0]) &
-                    (extracted['PCN_extracted'] == keys[1]) &
-                    (extracted['GRP_extracted'] == keys[2])
-                ]
-            elif level == 'BIN+GRP':
-                match_df = extracted[
-                    (extracted['BIN_extracted'] == keys[0]) &
-                    (extracted['GRP_extracted'] == keys[1])
-                ]
-            elif level == 'GRP':
-                match_df = extracted[
-                    (extracted['GRP_extracted'] == keys[0])
-                ]
-            elif level == 'BIN+PCN':
-                match_df = extracted[
-                    (extracted['BIN_extracted'] == keys[0]) &
-                    (extracted['PCN_extracted'] == keys[1])
-                ]
-            elif level == 'BIN':
-                match_df = extracted[
-                    (extracted['BIN_extracted'] == keys[0])
-                ]
-            else:
-                match_df = pd.DataFrame()
-
-            if not match_df.empty:
-                match_df = match_df.copy()
-                match_df['MatchLevel'] = level
-                match_df['Top10kIndex'] = index
-                match_df['BIN_top10k'] = BIN
-                match_df['PCN_top10k'] = PCN
-                match_df['GRP_top10k'] = GRP
-                chunk_matches.append(match_df)
-                matched = True
-                break  # found match, move to next row
-
-        if not matched:
-            chunk_matches.append(pd.DataFrame([{
-                'MatchLevel': 'No match found',
-                'Top10kIndex': index,
-                'BIN_top10k': BIN,
-                'PCN_top10k': PCN,
-                'GRP_top10k': GRP
-            }]))
-
-    # Write current chunk matches to CSV
-    if chunk_matches:
-        result_df = pd.concat(chunk_matches, ignore_index=True)
-        priority_cols = ['Top10kIndex', 'BIN_top10k', 'PCN_top10k', 'GRP_top10k', 'MatchLevel']
-        result_df = result_df[priority_cols + [col for col in result_df.columns if col not in priority_cols]]
-
-        if not os.path.exists(output_csv):
-            result_df.to_csv(output_csv, index=False)
+# === MATCH LEVELS === (a level applies to a row only when all of its parts are present)
+MATCH_LEVELS = [
+    ('BIN+PCN+GRP', ('BIN', 'PCN', 'GRP')),
+    ('BIN+GRP', ('BIN', 'GRP')),
+    ('GRP', ('GRP',)),
+    ('BIN+PCN', ('BIN', 'PCN')),
+    ('BIN', ('BIN',)),
+]
+NO_MATCH = 'No match found'
+PRIORITY_COLS = ['Top10kIndex', 'BIN_top10k', 'PCN_top10k', 'GRP_top10k', 'MatchLevel']
+
+
+def key_tuples(keys, names):
+    """Each row's key for one level as a tuple of plain Python values, or None when a part is missing."""
+    present = keys[list(names)].notna().all(axis=1).to_numpy()
+    values = zip(*[keys[name].astype(object).tolist() for name in names])
+    return [key if ok else None for key, ok in zip(values, present)]
+
+
+def build_level_indexes(extracted_keys):
+    """{level: {key tuple: extracted row positions}}, extracted rows in file order."""
+    indexes = {}
+    for level, names in MATCH_LEVELS:
+        positions = {}
+        for pos, key in enumerate(key_tuples(extracted_keys, names)):
+            if key is not None:
+                positions.setdefault(key, []).append(pos)
+        indexes[level] = {key: np.array(rows, dtype=np.int64) for key, rows in positions.items()}
+    return indexes
+
+
+def first_matches(top_keys, indexes):
+    """
+    (top row position, MatchLevel, extracted row position) for every output row, in top10k order;
+    unmatched rows come out once with extracted position -1.
+    """
+    level_keys = [(level, indexes[level], key_tuples(top_keys, names)) for level, names in MATCH_LEVELS]
+    top_pos, levels, right_pos = [], [], []
+    for pos in range(len(top_keys)):
+        for level, index, keys in level_keys:
+            rows = index.get(keys[pos]) if keys[pos] is not None else None
+            if rows is not None:
+                break
         else:
-            result_df.to_csv(output_csv, mode='a', index=False, header=False)
-
-    row_offset += len(chunk)
-
-print(f"✅ Done! Output saved to: {output_csv}")
+            level, rows = NO_MATCH, np.array([-1], dtype=np.int64)
+        top_pos.append(np.full(len(rows), pos, dtype=np.int64))
+        levels.append((level, len(rows)))
+        right_pos.append(rows)
+    if not top_pos:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=object), np.empty(0, dtype=np.int64)
+    names, counts = zip(*levels)
+    return np.concatenate(top_pos), np.repeat(np.array(names, dtype=object), counts), np.concatenate(right_pos)
+
+
+def match_rows(top10k, extracted, top_pos, levels, right_pos):
+    """Output rows: PRIORITY_COLS, then every extracted column (empty on 'No match found' rows)."""
+    top = top10k.take(top_pos).reset_index(drop=True)
+    result = pd.DataFrame({
+        'Top10kIndex': top_pos,
+        'BIN_top10k': top['BIN_top10k'],
+        'PCN_top10k': top['PCN_top10k'],
+        'GRP_top10k': top['GRP_top10k'],
+        'MatchLevel': levels,
+    })
+    # Position -1 is not in extracted's RangeIndex, so it reindexes to an empty row
+    return pd.concat([result, extracted.reindex(right_pos).reset_index(drop=True)], axis=1)
+
+
+def load_sheet(sheet, bin_col, pcn_col, grp_col):
+    """A sheet plus its compact BIN/PCN/GRP keys; BINs are written zero-padded to 6 digits."""
+    df = pd.read_excel(top10k_file, sheet_name=sheet)
+    keys = normalize_keys(df, bin_col, pcn_col, grp_col)
+    df[bin_col] = format_bin(keys['BIN']).astype(object).where(keys['BIN'].notna(), df[bin_col])
+    return df, keys
+
+
+def main():
+    # === CLEAN SETUP ===
+    if os.path.exists(output_csv):
+        os.remove(output_csv)
+
+    # === LOAD both sheets; index extracted once ===
+    extracted, extracted_keys = load_sheet(sheet_extracted, 'BIN_extracted', 'PCN_extracted', 'GRP_extracted')
+    top10k, top_keys = load_sheet(sheet_top10k, 'BIN_top10k', 'PCN_top10k', 'GRP_top10k')
+    indexes = build_level_indexes(extracted_keys)
+
+    # === PROCESS IN CHUNKS ===
+    for start in range(0, len(top10k), chunk_size):
+        chunk_keys = top_keys.iloc[start:start + chunk_size]
+        top_pos, levels, right_pos = first_matches(chunk_keys, indexes)
+        result_df = match_rows(top10k, extracted, top_pos + start, levels, right_pos)
+        result_df.to_csv(output_csv, mode='a', index=False, header=start == 0)
+
+    print(f"✅ Done! Output saved to: {output_csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import time
+import numpy as np
+import pandas as pd
+import join
+
+# First-match join at full size: top10k against Key+extracted resampled up to N_EXTRACTED rows.
+# The old per-row boolean-mask scan is timed on OLD_SAMPLE rows and extrapolated (a full run takes hours).
+
+# --- CONFIGURATION ---
+N_EXTRACTED = 100_000
+OLD_SAMPLE = 50
+SEED = 42
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def mask_scan(top_keys, extracted_keys, rows):
+    """The old approach: per top10k row and level, a full-column boolean mask over extracted."""
+    columns = {name: extracted_keys[name].astype(object) for name in ['BIN', 'PCN', 'GRP']}
+    for pos in rows:
+        for _, names in join.MATCH_LEVELS:
+            values = [top_keys[name].iloc[pos] for name in names]
+            if any(pd.isna(value) for value in values):
+                continue
+            mask = np.ones(len(extracted_keys), dtype=bool)
+            for name, value in zip(names, values):
+                mask &= (columns[name] == value).to_numpy(dtype=bool)
+            if mask.any():
+                break
+
+
+def assemble(top10k, extracted, top_keys, indexes):
+    """Matching plus building every output row, chunk by chunk as main() does (no CSV writing)."""
+    rows = 0
+    for start in range(0, len(top10k), join.chunk_size):
+        top_pos, levels, right_pos = join.first_matches(top_keys.iloc[start:start + join.chunk_size], indexes)
+        rows += len(join.match_rows(top10k, extracted, top_pos + start, levels, right_pos))
+    return rows
+
+
+# --- LOAD DATA ---
+print("Reading Excel file...")
+extracted, extracted_keys = join.load_sheet(join.sheet_extracted, 'BIN_extracted', 'PCN_extracted', 'GRP_extracted')
+top10k, top_keys = join.load_sheet(join.sheet_top10k, 'BIN_top10k', 'PCN_top10k', 'GRP_top10k')
+if N_EXTRACTED:
+    sample = np.random.default_rng(SEED).integers(len(extracted), size=N_EXTRACTED)
+    extracted = extracted.iloc[sample].reset_index(drop=True)
+    extracted_keys = extracted_keys.iloc[sample].reset_index(drop=True)
+print(f"{len(top10k)} top10k rows x {len(extracted)} extracted rows")
+
+# --- RUN ---
+indexes, build_time = timed(join.build_level_indexes, extracted_keys)
+(top_pos, levels, _), match_time = timed(join.first_matches, top_keys, indexes)
+output_rows, assemble_time = timed(assemble, top10k, extracted, top_keys, indexes)
+_, old_sample_time = timed(mask_scan, top_keys, extracted_keys, range(OLD_SAMPLE))
+old_time = old_sample_time / OLD_SAMPLE * len(top10k)
+
+print()
+print(pd.DataFrame([
+    {"Step": "Build level indexes (s)", "Time": build_time},
+    {"Step": "First-match lookups, all rows (s)", "Time": match_time},
+    {"Step": "Lookups + output rows, chunked (s)", "Time": assemble_time},
+    {"Step": f"Old mask scan, extrapolated from {OLD_SAMPLE} rows (s)", "Time": old_time},
+]).round(2).to_string(index=False))
+print(f"\n{output_rows:,} output rows; {len(np.unique(top_pos))} top10k rows, "
+      f"{int((levels == join.NO_MATCH).sum())} without a match. "
+      f"Lookups are {old_time / match_time:.0f}x faster than the mask scan.")
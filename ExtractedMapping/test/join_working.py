@@ -1,44 +1,138 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'code'))
+from bpg_keys import shared_categoricals
+
 # --- CONFIGURATION ---
 file_path = 'payer_data_020725_test.xlsx'
 output_path = 'merged_output_BPG_fallback_cascade_batchwise4.csv'
+# Fan-out per match level (levels not listed keep every match):
+#   ('cap', k)        keep the k best-ranked df1 rows per df2 row
+#   ('aggregate', n)  keep one row per df2 row, plus Match_Count and a sample of n SAMPLE_COLUMN values
+# e.g. {'GRP': ('cap', 50), 'BIN': ('aggregate', 5)} -- a common BIN like 610014 matches thousands of rows
+FANOUT = {}
+# Tie-breaker for capped/aggregated levels: df1 columns to rank by (None = df1 file order)
+RANK_BY = None
+RANK_ASCENDING = True
+SAMPLE_COLUMN = 'Plan Name/Group Name'
+# Warn before the join if the estimated output is bigger than this
+WARN_OUTPUT_ROWS = 50_000_000
+
+# Cascading match levels: (level, df2 column, df1 column)
+MATCH_LEVELS = [
+    ('BPG', 'BPG_top10k', 'BPG_extracted'),
+    ('BIN+GRP', 'B&G_top10k', 'B&G_extracted'),
+    ('GRP', 'GRP_top10k', 'GRP_extracted'),
+    ('BIN+PCN', 'B&P_top10k', 'B&P_extracted'),
+    ('BIN', 'BIN_top10k', 'BIN_extracted'),
+]
+NULL_PATTERNS = {
+    'BPG_top10k': '(NULL)(NULL)(NULL)',
+    'B&G_top10k': '(NULL)(NULL)',
+    'B&P_top10k': '(NULL)(NULL)',
+    'GRP_top10k': '(NULL)',
+    'BIN_top10k': '(NULL)',
+}
 
 # Load df2
 df2 = pd.read_excel(file_path, sheet_name='Key+top10k')
 df2['_original_index'] = df2.index
 
+# Load df1
+df1 = pd.read_excel(file_path, sheet_name='Key+extracted')
+
+# Sanitize join columns, then store each level's key pair as categoricals over shared categories:
+# one small integer code per row instead of a Python string, and merges compare codes
+for _, left_col, right_col in MATCH_LEVELS:
+    df2[left_col] = df2[left_col].fillna('NULL').astype(str).str.strip()
+    df1[right_col] = df1[right_col].fillna('NULL').astype(str).str.strip()
+    df2[left_col], df1[right_col] = shared_categoricals(df2[left_col], df1[right_col])
+
 # Create chunk list
 chunk_size = 1000
 df2_chunks = np.array_split(df2, max(1, len(df2) // chunk_size + 1))
 
-# Load df1
-df1 = pd.read_excel(file_path, sheet_name='Key+extracted')
-
-# Sanitize df1 join columns
-for col in ['BPG_extracted', 'B&G_extracted', 'GRP_extracted', 'B&P_extracted', 'BIN_extracted']:
-    df1[col] = df1[col].fillna('NULL').astype(str).str.strip()
+for level, policy in FANOUT.items():
+    if level not in [name for name, _, _ in MATCH_LEVELS] or policy[0] not in ('cap', 'aggregate') or policy[1] < 1:
+        raise ValueError(f"Bad fan-out policy {level!r}: {policy!r}")
+
+# Tie-breaker order for capped/aggregated levels: merges keep df1 order within a df2 row
+if RANK_BY:
+    df1 = df1.sort_values(RANK_BY, ascending=RANK_ASCENDING, kind='stable', na_position='last')
+
+# Output columns that only exist when some level is capped/aggregated
+FANOUT_COLUMNS = (['Match_Count'] if FANOUT else []) + \
+    (['Match_Sample'] if any(mode == 'aggregate' for mode, _ in FANOUT.values()) else [])
+
+# --- PRE-JOIN CARDINALITY ESTIMATE ---
+# Replays the cascade on key columns only: per-level df1 key counts looked up for every df2 row
+def estimate_output_rows(df2, df1):
+    is_null = pd.concat([df2[col] == pattern for col, pattern in NULL_PATTERNS.items()], axis=1).all(axis=1)
+    open_rows = ~is_null.to_numpy()
+
+    rows = []
+    for level, left_col, right_col in MATCH_LEVELS:
+        counts = df2[left_col].map(df1[right_col].value_counts()).astype(float).fillna(0).to_numpy()
+        hit = open_rows & (counts > 0)
+        level_counts = counts[hit].astype(np.int64)
+        open_rows &= ~hit
+        mode, limit = FANOUT.get(level, ('all', 0))
+        if mode == 'cap':
+            output_rows = int(np.minimum(level_counts, limit).sum())
+        elif mode == 'aggregate':
+            output_rows = len(level_counts)
+        else:
+            output_rows = int(level_counts.sum())
+        rows.append({'Level': level, 'Policy': f'{mode} {limit}' if limit else mode, 'Rows Matched': len(level_counts),
+                     'Output Rows (keep all)': int(level_counts.sum()), 'Output Rows': output_rows})
+    unmatched = int(open_rows.sum() + is_null.sum())
+    rows.append({'Level': 'Unmatched', 'Policy': '', 'Rows Matched': unmatched,
+                 'Output Rows (keep all)': unmatched, 'Output Rows': unmatched})
+    return pd.DataFrame(rows)
+
+estimate = estimate_output_rows(df2, df1)
+print(estimate.to_string(index=False))
+total_rows = int(estimate['Output Rows'].sum())
+if total_rows > WARN_OUTPUT_ROWS:
+    print(f"⚠️ This run will write {total_rows:,} rows (more than {WARN_OUTPUT_ROWS:,}). "
+          f"Consider capping or aggregating the GRP/BIN levels in FANOUT.")
+else:
+    print(f"✅ Estimated output: {total_rows:,} rows.")
+
+# --- FUNCTION: Apply a Level's Fan-out Policy ---
+def apply_fanout(matched, level):
+    if level not in FANOUT:
+        return matched
+    mode, limit = FANOUT[level]
+    per_row = matched.groupby('_row_id', sort=False)
+    matched = matched.assign(Match_Count=per_row['_row_id'].transform('size'))
+    if mode == 'cap':
+        return matched[per_row.cumcount() < limit]
+
+    # aggregate: first match per row, plus the first n distinct sample values
+    sample_col = f'{SAMPLE_COLUMN}_matched' if f'{SAMPLE_COLUMN}_matched' in matched.columns else SAMPLE_COLUMN
+    samples = (
+        matched[['_row_id', sample_col]].dropna().astype({sample_col: str}).drop_duplicates()
+        .groupby('_row_id', sort=False)[sample_col].agg(lambda values: ' | '.join(values.head(limit)))
+    )
+    first = matched[per_row.cumcount() == 0].copy()
+    first['Match_Sample'] = first['_row_id'].map(samples)
+    return first
 
 # --- FUNCTION: Process a Chunk of df2 ---
 def process_chunk(df2_chunk, df1, row_offset):
     df2_chunk = df2_chunk.copy()
 
-    # Sanitize df2 join columns
-    for col in ['BPG_top10k', 'B&G_top10k', 'GRP_top10k', 'B&P_top10k', 'BIN_top10k']:
-        df2_chunk[col] = df2_chunk[col].fillna('NULL').astype(str).str.strip()
-
     # Assign global row IDs
     df2_chunk['_row_id'] = range(row_offset, row_offset + len(df2_chunk))
 
     # ❗ Identify fully null-pattern rows across all match keys
-    null_mask = (
-        (df2_chunk['BPG_top10k'] == '(NULL)(NULL)(NULL)') &
-        (df2_chunk['B&G_top10k'] == '(NULL)(NULL)') &
-        (df2_chunk['B&P_top10k'] == '(NULL)(NULL)') &
-        (df2_chunk['GRP_top10k'] == '(NULL)') &
-        (df2_chunk['BIN_top10k'] == '(NULL)')
-    )
+    null_mask = pd.concat(
+        [df2_chunk[col] == pattern for col, pattern in NULL_PATTERNS.items()], axis=1
+    ).all(axis=1)
     df_unmatched = df2_chunk[null_mask].copy()
     df_unmatched['Matched_Level'] = 'Unmatched'
 
@@ -59,22 +153,16 @@ def process_chunk(df2_chunk, df1, row_offset):
         return merged
 
     # Cascading match levels
-    for level, left_col, right_col in [
-        ('BPG', 'BPG_top10k', 'BPG_extracted'),
-        ('BIN+GRP', 'B&G_top10k', 'B&G_extracted'),
-        ('GRP', 'GRP_top10k', 'GRP_extracted'),
-        ('BIN+PCN', 'B&P_top10k', 'B&P_extracted'),
-        ('BIN', 'BIN_top10k', 'BIN_extracted'),
-    ]:
+    for level, left_col, right_col in MATCH_LEVELS:
         df2_unmatched_now = df2_matchable[~df2_matchable['_row_id'].isin(matched_row_ids)]
         if df2_unmatched_now.empty:
             break
 
         matched = merge_and_tag(df2_unmatched_now, df1, left_col, right_col, level)
 
-        # ❗ Keep all matches per row — do NOT drop duplicates
-        all_matches.append(matched)
+        # ❗ Keep all matches per row unless FANOUT caps/aggregates this level
         matched_row_ids.update(matched['_row_id'].unique())
+        all_matches.append(apply_fanout(matched, level))
 
     # Remaining unmatched rows
     final_unmatched = df2_matchable[~df2_matchable['_row_id'].isin(matched_row_ids)]
@@ -82,7 +170,10 @@ def process_chunk(df2_chunk, df1, row_offset):
 
     # Combine results
     all_matches.extend([final_unmatched, df_unmatched])
-    return pd.concat(all_matches, ignore_index=True)
+    result = pd.concat(all_matches, ignore_index=True)
+
+    # Same columns in every chunk, whether or not a capped/aggregated level hit in it
+    return result.reindex(columns=[c for c in result.columns if c not in FANOUT_COLUMNS] + FANOUT_COLUMNS)
 
 # --- PROCESS ALL CHUNKS ---
 first_chunk = True
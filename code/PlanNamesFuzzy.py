@@ -1,7 +1,5 @@
 import pandas as pd
-import re
-from rapidfuzz import fuzz, process, utils, distance
-import numpy as np
+from plan_matching import build_abbrev_map, Normalizer, build_choices, match_plans, CandidateIndex, MatchCache, model_fingerprint
 
 
 # --------------------
@@ -13,8 +11,16 @@ SHEET_B = "DataModel"
 SHEET_ABBR = "Abb.s"
 COL_NAME_A = "Plan Name/Group Name"
 COL_NAME_B = "Plan"
-OUTPUT_FILE = "matched_plans.xlsx"
+# 1 -> best match per name (matched_plans.xlsx), 3 -> top 3 matches per name (matched_plans_top3.xlsx)
+TOP_K = 1
+OUTPUT_FILE = "matched_plans.xlsx" if TOP_K == 1 else f"matched_plans_top{TOP_K}.xlsx"
 SCORE_THRESHOLD = 85
+# Only score each name against the best candidates from a token/n-gram index (faster on a
+# large DataModel, may miss a few matches; see plan_matching_benchmark.py for recall)
+USE_BLOCKING = False
+BLOCKING_CANDIDATES = 200
+# Scores are reused across runs (and TOP_K settings) while the DataModel/Abb.s sheets don't change (None to disable)
+CACHE_FILE = "plan_match_cache.json"
 
 # --------------------
 # LOAD DATA
@@ -25,78 +31,53 @@ sheet_b = pd.read_excel(FILE_PATH, sheet_name=SHEET_B)
 abbrev_df = pd.read_excel(FILE_PATH, sheet_name=SHEET_ABBR)
 
 # --------------------
-# BUILD ABBREVIATION MAP
+# BUILD NORMALIZER (cleanup + abbreviation expansion)
 # --------------------
-abbrev_map = dict(zip(
-    abbrev_df["Abbreviations"].astype(str).str.lower().str.strip(),
-    abbrev_df["Full Form"].astype(str).str.lower().str.strip()
-))
-
-# --------------------
-# CLEANING + NORMALIZATION
-# --------------------
-def clean_text(text):
-    text = str(text).lower()
-    text = re.sub(r'\(.*?\)', '', text)                  # remove anything in brackets
-    text = re.sub(r'[^a-zA-Z0-9\s]', '', text)           # remove special characters
-    text = re.sub(r'\s+', ' ', text)                     # normalize spaces
-    return text.strip()
-
-def expand_abbreviations(text, mapping):
-    words = text.split()
-    expanded_words = [mapping.get(word, word) for word in words]
-    return ' '.join(expanded_words)
-
-def preprocess(text):
-    return expand_abbreviations(clean_text(text), abbrev_map)
+normalizer = Normalizer(build_abbrev_map(abbrev_df))
 
 # --------------------
 # PREPROCESS PLAN NAMES
 # --------------------
 print("Preprocessing plan names...")
-sheet_a["cleaned"] = sheet_a[COL_NAME_A].astype(str).apply(preprocess)
-sheet_b["cleaned"] = sheet_b[COL_NAME_B].astype(str).apply(preprocess)
-plans_b_cleaned = sheet_b["cleaned"].dropna().unique().tolist()
+plans_b_cleaned, cleaned_to_original = build_choices(sheet_b, COL_NAME_B, normalizer)
+index = CandidateIndex(plans_b_cleaned, candidates=BLOCKING_CANDIDATES) if USE_BLOCKING else None
+cache = MatchCache(CACHE_FILE, model_fingerprint(sheet_b, COL_NAME_B, normalizer, index)) if CACHE_FILE else None
 
 # --------------------
-# MATCH FUNCTION (Handles slash-separated names)
-# --------------------
-def get_best_match_from_split(text, choices):
-    parts = [preprocess(part) for part in str(text).split("/")]
-    best_match = None
-    best_score = -1
-    best_original = None
-    
-    for part in parts:
-        match = process.extractOne(part, choices, scorer=fuzz.token_sort_ratio)
-        if match:
-            matched_cleaned, score, _ = match
-            if score > best_score:
-                best_score = score
-                best_match = matched_cleaned
-                match_row = sheet_b[sheet_b["cleaned"] == matched_cleaned]
-                best_original = match_row[COL_NAME_B].values[0] if not match_row.empty else matched_cleaned
-
-    return best_original, best_score
-
-# --------------------
-# MATCHING LOOP
+# MATCHING (batched cdist over all slash-separated parts)
 # --------------------
 print("Matching plans with score threshold...")
+all_matches = match_plans(sheet_a[COL_NAME_A].tolist(), plans_b_cleaned, cleaned_to_original, normalizer,
+                          top_k=TOP_K, index=index, cache=cache)
+if cache is not None:
+    cache.save()
+
 matches = []
-for original_text in sheet_a[COL_NAME_A]:
-    best_match, score = get_best_match_from_split(original_text, plans_b_cleaned)
-    
-    if score >= SCORE_THRESHOLD:
-        matches.append((original_text, best_match, score))
+for original_text, top_matches in zip(sheet_a[COL_NAME_A], all_matches):
+    if TOP_K == 1:
+        # A name that cleans to nothing still scores 0 against the plans, as with the old extractOne loop.
+        # -1 means nothing was scored at all: an empty DataModel (extractOne returned None there too),
+        # or, with USE_BLOCKING, a name that shares no tokens/n-grams with any plan
+        best_match, score = top_matches[0] if top_matches else (None, -1)
+        matches.append((original_text, best_match if score >= SCORE_THRESHOLD else None, score))
     else:
-        matches.append((original_text, None, score))
+        row = [original_text]
+        for i in range(TOP_K):
+            if i < len(top_matches):
+                row.extend([top_matches[i][0], top_matches[i][1]])  # plan name, score
+            else:
+                row.extend([None, None])
+        matches.append(row)
 
 # --------------------
 # SAVE TO EXCEL
 # --------------------
 print("Saving results...")
-results_df = pd.DataFrame(matches, columns=["SheetA_Original", "Best_Match_SheetB", "Match_Score"])
+if TOP_K == 1:
+    columns = ["SheetA_Original", "Best_Match_SheetB", "Match_Score"]
+else:
+    columns = ["SheetA_Original"] + [f"Match{i}_{field}" for i in range(1, TOP_K + 1) for field in ("Plan", "Score")]
+results_df = pd.DataFrame(matches, columns=columns)
 results_df.to_excel(OUTPUT_FILE, index=False)
 
 print(f"✅ Matching complete. Results saved to: {OUTPUT_FILE}")
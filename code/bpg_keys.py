@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+# Compact BIN/PCN/GRP keys:
+# - BIN as nullable uint32 (4 bytes, compared as numbers, so '4336', '004336' and 4336.0 are equal)
+# - PCN/GRP as categoricals (one small code per row plus each distinct string once)
+# - blanks and 'NULL' placeholders as real nulls, which never equal anything
+NULL_STRINGS = ['', 'NULL']
+BIN_WIDTH = 6
+# Multiplier for mixing part hashes into one level code (64-bit FNV prime)
+HASH_MIX = np.uint64(0x100000001B3)
+
+
+def per_unique(values, parse):
+    """Run a vectorized `parse` on each distinct value once, then broadcast the result to every row."""
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values.to_numpy(dtype=object))
+    parsed = parse(pd.Series(uniques, dtype=object)).reset_index(drop=True)
+    # code -1 (missing) is not a label, so it reindexes to <NA>
+    return pd.Series(parsed.reindex(codes).array, index=values.index, name=values.name)
+
+
+def clean_text_key(values):
+    """Stripped strings; blanks and 'NULL' placeholders become <NA>."""
+    s = pd.Series(values).astype('string').str.strip()
+    return s.mask(s.isin(NULL_STRINGS))
+
+
+def _parse_bins(values):
+    s = clean_text_key(values).str.split('.', n=1).str[0]
+    numeric = s.str.fullmatch(r'\d{1,9}').fillna(False).astype(bool)
+    return pd.to_numeric(s.where(numeric), errors='coerce').astype('UInt32')
+
+
+def parse_bin(values):
+    """
+    BINs as UInt32: decimals dropped ('4336.0' -> 4336), leading zeros irrelevant.
+    Anything that isn't all digits ('Not Found', '*004336') becomes <NA>.
+    """
+    return per_unique(values, _parse_bins)
+
+
+def format_bin(bins):
+    """UInt32 BINs back to zero-padded 6-digit strings for output; <NA> stays missing."""
+    return bins.astype('string').str.zfill(BIN_WIDTH)
+
+
+def to_category(values):
+    """PCN/GRP as a categorical of stripped strings; blanks/'NULL' are nulls, not a category."""
+    return per_unique(values, lambda uniques: clean_text_key(uniques).astype('category'))
+
+
+def normalize_keys(df, bin_col, pcn_col, grp_col):
+    """BIN/PCN/GRP of `df` in compact form, as columns 'BIN', 'PCN', 'GRP'."""
+    return pd.DataFrame({
+        'BIN': parse_bin(df[bin_col]),
+        'PCN': to_category(df[pcn_col]),
+        'GRP': to_category(df[grp_col]),
+    }, index=df.index)
+
+
+def part_hashes(part):
+    """
+    uint64 hash of each row's value; categoricals hash each category once.
+    Depends only on the value, so codes from different tables and runs can be compared.
+    """
+    return pd.util.hash_pandas_object(part, index=False).to_numpy()
+
+
+def level_codes(keys, names, null_code=-1):
+    """int64 code per row for the key made of the `names` parts; null_code where any part is missing."""
+    present = keys[list(names)].notna().all(axis=1).to_numpy()
+    codes = part_hashes(keys[names[0]])
+    for name in names[1:]:
+        codes = codes * HASH_MIX ^ part_hashes(keys[name])
+    return np.where(present, codes.view(np.int64), np.int64(null_code))
+
+
+def shared_categoricals(left, right):
+    """Two key columns as categoricals over one shared category set, so merges compare integer codes."""
+    left, right = pd.Series(left).astype('category'), pd.Series(right).astype('category')
+    categories = left.cat.categories.union(right.cat.categories)
+    return left.cat.set_categories(categories), right.cat.set_categories(categories)
@@ -0,0 +1,82 @@
+import re
+import time
+import numpy as np
+import pandas as pd
+from plan_matching import build_abbrev_map, Normalizer
+
+# --------------------
+# CONFIGURATION
+# --------------------
+FILE_PATH = r"D:\Projects\new\BPGscript\input\PlanNamesFuzzy.xlsx"  # Change this to your actual path
+SHEET_A = "ExtractedData"
+SHEET_B = "DataModel"
+SHEET_ABBR = "Abb.s"
+COL_NAME_A = "Plan Name/Group Name"
+COL_NAME_B = "Plan"
+N_NAMES = 1_000_000
+SEED = 42
+
+# --------------------
+# OLD PIPELINE (per-name apply, three re.sub passes, single-token dict lookup)
+# --------------------
+def legacy_clean_text(text):
+    text = str(text).lower()
+    text = re.sub(r'\(.*?\)', '', text)
+    text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+def legacy_abbrev_map(abbrev_df):
+    return dict(zip(
+        abbrev_df["Abbreviations"].astype(str).str.lower().str.strip(),
+        abbrev_df["Full Form"].astype(str).str.lower().str.strip()
+    ))
+
+def legacy_preprocess(text, mapping):
+    return ' '.join(mapping.get(word, word) for word in legacy_clean_text(text).split())
+
+# --------------------
+# LOAD DATA
+# --------------------
+print("Reading Excel file...")
+sheet_a = pd.read_excel(FILE_PATH, sheet_name=SHEET_A)
+sheet_b = pd.read_excel(FILE_PATH, sheet_name=SHEET_B)
+abbrev_df = pd.read_excel(FILE_PATH, sheet_name=SHEET_ABBR)
+
+old_abbrev_map = legacy_abbrev_map(abbrev_df)
+normalizer = Normalizer(build_abbrev_map(abbrev_df))
+
+real_names = pd.concat([sheet_a[COL_NAME_A], sheet_b[COL_NAME_B]]).astype(str).to_numpy()
+rng = np.random.default_rng(SEED)
+sampled = pd.Series(rng.choice(real_names, N_NAMES))
+# Every name distinct, so the per-unique-value shortcut can't help
+distinct = sampled + " " + pd.Series(np.arange(N_NAMES)).astype(str)
+
+# --------------------
+# RUN
+# --------------------
+rows = []
+for label, names in [("sampled (repeats)", sampled), ("all distinct", distinct)]:
+    start = time.perf_counter()
+    names.apply(legacy_preprocess, args=(old_abbrev_map,))
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normalizer.series(names)
+    new_time = time.perf_counter() - start
+
+    rows.append({
+        "Names": label,
+        "Count": len(names),
+        "Old apply (s)": round(legacy_time, 2),
+        "Normalizer.series (s)": round(new_time, 2),
+        "Speedup": round(legacy_time / new_time, 1),
+    })
+
+print()
+print(pd.DataFrame(rows).to_string(index=False))
+
+# Names whose result changes: multi-word/hyphenated keys now expand, blank full forms no longer become "nan"
+unique_names = pd.unique(real_names)
+changed = sum(normalizer(name) != legacy_preprocess(name, old_abbrev_map) for name in unique_names)
+print(f"\n{changed} of {len(unique_names)} distinct real names normalize differently than before.")
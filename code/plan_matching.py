@@ -0,0 +1,364 @@
+import os
+import re
+import json
+import math
+import hashlib
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+# --------------------
+# SETTINGS
+# --------------------
+# Upper bound on the score matrix held in memory at once (query block x all choices, float64)
+MAX_BLOCK_BYTES = 256 * 1024 * 1024
+
+# Candidate blocking: character n-gram size, and features shared by more than this
+# fraction of plans are dropped (they add no signal and make postings lists huge)
+NGRAM_SIZE = 3
+MAX_FEATURE_DF = 0.2
+
+# --------------------
+# CLEANING + NORMALIZATION
+# --------------------
+# Brackets and special characters removed with one combined regex (brackets are tried first,
+# so "(HMO D-SNP)" goes as a whole), then whitespace collapsed with split/join
+CLEANUP_RE = re.compile(r'\(.*?\)|[^a-zA-Z0-9\s]')
+
+def clean_text(text):
+    return ' '.join(CLEANUP_RE.sub('', str(text).lower()).split())
+
+def clean_series(series):
+    """clean_text over a whole column; each distinct value is cleaned once."""
+    values = series.astype(str)
+    return values.map({value: clean_text(value) for value in values.unique()})
+
+def build_abbrev_map(abbrev_df):
+    """
+    Abbreviation -> full form, both cleaned like plan names so keys such as "HMO D-SNP" or
+    "MA-PD" line up with cleaned tokens. Rows without a full form are skipped.
+    """
+    abbrevs = abbrev_df.dropna(subset=["Abbreviations", "Full Form"])
+    keys = clean_series(abbrevs["Abbreviations"])
+    full_forms = clean_series(abbrevs["Full Form"])
+    return {key: full for key, full in zip(keys, full_forms) if key and full}
+
+_END = object()
+
+class Normalizer:
+    """
+    Compiled clean + abbreviation expansion. Abbreviation keys are stored in a token trie,
+    so multi-word keys are expanded and the longest key wins ("hmo dsnp" over "hmo").
+    """
+
+    def __init__(self, abbrev_map):
+        self.abbrev_map = abbrev_map
+        self.trie = {}
+        for key, full_form in abbrev_map.items():
+            node = self.trie
+            for token in key.split():
+                node = node.setdefault(token, {})
+            node[_END] = full_form
+
+    def expand(self, text):
+        tokens = text.split()
+        trie = self.trie
+        if not any(token in trie for token in tokens):
+            return text
+
+        out = []
+        i, n = 0, len(tokens)
+        while i < n:
+            node = trie.get(tokens[i])
+            if node is None:
+                out.append(tokens[i])
+                i += 1
+                continue
+            # Walk the trie as far as the tokens allow, remembering the longest complete key
+            j, longest = i + 1, None
+            while True:
+                if _END in node:
+                    longest = (j, node[_END])
+                if j == n or tokens[j] not in node:
+                    break
+                node = node[tokens[j]]
+                j += 1
+            if longest:
+                i, full_form = longest
+                out.append(full_form)
+            else:
+                out.append(tokens[i])
+                i += 1
+        return ' '.join(out)
+
+    def __call__(self, text):
+        return self.expand(clean_text(text))
+
+    def series(self, series):
+        """Normalize a whole column; each distinct value is cleaned and expanded once."""
+        values = series.astype(str)
+        return values.map({value: self.expand(clean_text(value)) for value in values.unique()})
+
+# --------------------
+# CHOICES (DataModel side)
+# --------------------
+def build_choices(sheet_b, col_name, normalizer):
+    """
+    Preprocess the DataModel plans once.
+    Returns the unique cleaned names (in first-seen order) and a dict mapping
+    each cleaned name back to the first original plan name it came from.
+    """
+    cleaned = normalizer.series(sheet_b[col_name])
+    first_seen = pd.DataFrame({"cleaned": cleaned, "original": sheet_b[col_name]}).drop_duplicates("cleaned")
+    choices = first_seen["cleaned"].tolist()
+    cleaned_to_original = dict(zip(first_seen["cleaned"], first_seen["original"]))
+    return choices, cleaned_to_original
+
+# --------------------
+# BATCHED SCORING
+# --------------------
+def score_top_k(queries, choices, k, scorer=fuzz.token_sort_ratio, workers=-1, max_block_bytes=MAX_BLOCK_BYTES):
+    """
+    Score every query against every choice with process.cdist, one block of queries at a time.
+    Returns (indices, scores), both shaped (len(queries), k), best first. Ties keep the
+    lower choice index, like process.extract. Missing slots have index -1.
+    """
+    n, m = len(queries), len(choices)
+    k = min(k, m)
+    top_idx = np.full((n, k), -1, dtype=np.int64)
+    top_scores = np.zeros((n, k), dtype=np.float64)
+    if n == 0 or k == 0:
+        return top_idx, top_scores
+
+    block_rows = max(1, max_block_bytes // (m * 8))
+    for start in range(0, n, block_rows):
+        block = queries[start:start + block_rows]
+        scores = process.cdist(block, choices, scorer=scorer, dtype=np.float64, workers=workers)
+
+        if k == 1:
+            best = scores.argmax(axis=1)  # argmax returns the first (lowest index) maximum
+            top_idx[start:start + len(block), 0] = best
+            top_scores[start:start + len(block), 0] = scores[np.arange(len(block)), best]
+            continue
+
+        # k-th best score per row, then order everything at or above it by (score desc, index asc)
+        kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+        for row in range(len(block)):
+            candidates = np.flatnonzero(scores[row] >= kth[row])
+            order = np.lexsort((candidates, -scores[row, candidates]))[:k]
+            top_idx[start + row] = candidates[order]
+            top_scores[start + row] = scores[row, candidates[order]]
+
+    return top_idx, top_scores
+
+# --------------------
+# CANDIDATE BLOCKING INDEX
+# --------------------
+def name_features(text, ngram_size=NGRAM_SIZE):
+    """Whole tokens plus character n-grams of each token (padded so prefixes/suffixes count)."""
+    features = set()
+    for token in text.split():
+        features.add("w:" + token)
+        padded = f" {token} "
+        for i in range(max(1, len(padded) - ngram_size + 1)):
+            features.add("g:" + padded[i:i + ngram_size])
+    return features
+
+class CandidateIndex:
+    """
+    Inverted index over the tokens and character n-grams of the preprocessed choices.
+    Features are weighted by inverse document frequency, so a rare token like a plan
+    code counts far more than "medicare" or "plan". A query is only scored against
+    the `candidates` choices with the highest summed weight of shared features.
+    """
+
+    def __init__(self, choices, candidates=200, ngram_size=NGRAM_SIZE, max_feature_df=MAX_FEATURE_DF):
+        self.choices = choices
+        self.candidates = candidates
+        self.ngram_size = ngram_size
+        self.max_feature_df = max_feature_df
+
+        postings = defaultdict(list)
+        for idx, choice in enumerate(choices):
+            for feature in name_features(choice, ngram_size):
+                postings[feature].append(idx)
+
+        n = len(choices)
+        max_df = max(1, int(max_feature_df * n))
+        self.postings = {}
+        self.weights = {}
+        for feature, idxs in postings.items():
+            if len(idxs) <= max_df:
+                self.postings[feature] = np.asarray(idxs, dtype=np.int64)
+                self.weights[feature] = math.log(n / len(idxs))
+
+        # Length normalization so long names with many rare tokens don't crowd out close matches
+        norms = np.zeros(n)
+        for feature, idxs in self.postings.items():
+            norms[idxs] += self.weights[feature] ** 2
+        self.norms = np.sqrt(np.maximum(norms, 1e-12))
+
+    def lookup(self, query):
+        """Indices (ascending) of the best-overlapping choices for `query`."""
+        features = [f for f in name_features(query, self.ngram_size) if f in self.postings]
+        if not features:
+            return np.empty(0, dtype=np.int64)
+
+        lists = [self.postings[f] for f in features]
+        hits = np.concatenate(lists)
+        weights = np.repeat([self.weights[f] for f in features], [len(p) for p in lists])
+        overlap = np.bincount(hits, weights=weights, minlength=len(self.choices)) / self.norms
+
+        if self.candidates < len(overlap):
+            top = np.argpartition(-overlap, self.candidates - 1)[:self.candidates]
+        else:
+            top = np.arange(len(overlap))
+        return np.sort(top[overlap[top] > 0])
+
+def score_top_k_blocked(queries, index, k, scorer=fuzz.token_sort_ratio):
+    """Same output as score_top_k, but each query is only scored against its index candidates."""
+    n = len(queries)
+    k = min(k, len(index.choices))
+    top_idx = np.full((n, k), -1, dtype=np.int64)
+    top_scores = np.zeros((n, k), dtype=np.float64)
+
+    for row, query in enumerate(queries):
+        candidates = index.lookup(query)
+        if len(candidates) == 0:
+            continue
+        # Candidates are in ascending choice order, so ties still resolve to the lower index
+        subset = [index.choices[i] for i in candidates]
+        for slot, (_, score, pos) in enumerate(process.extract(query, subset, scorer=scorer, limit=k)):
+            top_idx[row, slot] = candidates[pos]
+            top_scores[row, slot] = score
+
+    return top_idx, top_scores
+
+def measure_recall(queries, choices, index, k=1, min_score=0, scorer=fuzz.token_sort_ratio):
+    """
+    Compare the blocked scorer with the exhaustive one, over the queries whose exhaustive
+    best score is at least `min_score` (use the match threshold to ignore junk queries).
+    top1_recall: share of queries whose blocked best score equals the exhaustive best score.
+    topk_recall: share of exhaustive top-k scores that the blocked top-k also found.
+    """
+    _, exact_scores = score_top_k(queries, choices, k, scorer=scorer)
+    _, blocked_scores = score_top_k_blocked(queries, index, k, scorer=scorer)
+
+    keep = exact_scores[:, 0] >= min_score if len(queries) else np.zeros(0, dtype=bool)
+    if not keep.any():
+        return {"queries": 0, "top1_recall": 1.0, "topk_recall": 1.0}
+    exact_scores, blocked_scores = exact_scores[keep], blocked_scores[keep]
+
+    top1 = float(np.mean(np.isclose(exact_scores[:, 0], blocked_scores[:, 0])))
+    # Scores are sorted best first, so the blocked list is complete when each slot is at least as good
+    topk = float(np.mean(blocked_scores >= exact_scores - 1e-9))
+    return {"queries": int(keep.sum()), "top1_recall": top1, "topk_recall": topk}
+
+# --------------------
+# PERSISTENT MATCH CACHE
+# --------------------
+def model_fingerprint(sheet_b, col_name, normalizer, index=None):
+    """
+    Hash of everything a cached match depends on: DataModel plans, abbreviations and blocking settings.
+    top_k is not part of it; MatchCache keeps how many matches each name was scored for.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps(sheet_b[col_name].astype(str).tolist()).encode())
+    hasher.update(json.dumps(sorted(normalizer.abbrev_map.items())).encode())
+    blocking = None if index is None else [index.candidates, index.ngram_size, index.max_feature_df]
+    hasher.update(json.dumps(blocking).encode())
+    return hasher.hexdigest()
+
+class MatchCache:
+    """
+    On-disk JSON cache of cleaned query -> {"k": top_k it was scored for, "matches": [[cleaned match, score], ...]}.
+    An entry serves any run asking for at most k matches (its list is best first, so it is cut to
+    length), so switching TOP_K between 1 and 3 keeps the cache; a name is only re-scored when a run
+    wants more matches than it has. Entries are only reused while the fingerprint matches; a changed
+    DataModel or abbreviation sheet starts a fresh cache.
+    """
+
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.matches = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                if data.get("fingerprint") == fingerprint:
+                    self.matches = data.get("matches", {})
+            except (IOError, ValueError) as e:
+                print(f"⚠️  Ignoring unreadable match cache {path}: {e}")
+
+    def get(self, query, top_k):
+        """The cached top_k matches of `query`, or None when it was not scored for that many."""
+        entry = self.matches.get(query)
+        if entry is None or entry["k"] < top_k:
+            return None
+        return entry["matches"][:top_k]
+
+    def put(self, query, top_k, matches):
+        self.matches[query] = {"k": top_k, "matches": matches}
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "matches": self.matches}, f)
+        os.replace(tmp_path, self.path)
+
+# --------------------
+# MATCH (Handles slash-separated names)
+# --------------------
+def match_plans(texts, choices, cleaned_to_original, normalizer, top_k=1, index=None, cache=None):
+    """
+    Match each text against the preprocessed choices. Slash-separated names are split and
+    every part is scored; a row keeps its top_k unique matches over all parts.
+    Repeated texts and parts are only preprocessed and scored once. Pass a CandidateIndex
+    built on `choices` to score only blocked candidates, and a MatchCache to reuse scores
+    from earlier runs.
+    Returns one list of (original plan name, score) per text, best first.
+    """
+    # Preprocess each distinct text once, all parts in one vectorized pass
+    distinct_texts = list(dict.fromkeys(str(text) for text in texts))
+    raw_parts = [text.split("/") for text in distinct_texts]
+    cleaned_parts = iter(normalizer.series(pd.Series([part for parts in raw_parts for part in parts], dtype=object)))
+    text_parts = {text: [next(cleaned_parts) for _ in parts] for text, parts in zip(distinct_texts, raw_parts)}
+
+    # Score each distinct cleaned part once, skipping the ones already in the cache
+    unique_parts = list(dict.fromkeys(part for parts in text_parts.values() for part in parts))
+    part_matches = {}
+    if cache is not None:
+        cached = ((part, cache.get(part, top_k)) for part in unique_parts)
+        part_matches = {part: matches for part, matches in cached if matches is not None}
+    to_score = [part for part in unique_parts if part not in part_matches]
+
+    if to_score:
+        if index is None:
+            top_idx, top_scores = score_top_k(to_score, choices, top_k)
+        else:
+            top_idx, top_scores = score_top_k_blocked(to_score, index, top_k)
+        for part, idxs, scores in zip(to_score, top_idx, top_scores):
+            part_matches[part] = [[choices[i], float(score)] for i, score in zip(idxs, scores) if i >= 0]
+
+    if cache is not None:
+        for part in to_score:
+            cache.put(part, top_k, part_matches[part])
+        print(f"Match cache: {len(unique_parts) - len(to_score)} of {len(unique_parts)} distinct names reused")
+
+    text_results = {}
+    for text, parts in text_parts.items():
+        row_candidates = [match for part in parts for match in part_matches[part]]
+        # Stable sort keeps earlier parts first when scores tie
+        seen = set()
+        result = []
+        for match_text, score in sorted(row_candidates, key=lambda x: x[1], reverse=True):
+            if match_text not in seen:
+                seen.add(match_text)
+                result.append((cleaned_to_original.get(match_text, match_text), score))
+            if len(seen) >= top_k:
+                break
+        text_results[text] = result
+
+    return [text_results[str(text)] for text in texts]
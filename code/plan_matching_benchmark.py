@@ -0,0 +1,95 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from plan_matching import (
+    build_abbrev_map, Normalizer, build_choices,
+    score_top_k, score_top_k_blocked, CandidateIndex, measure_recall
+)
+
+# --------------------
+# CONFIGURATION
+# --------------------
+FILE_PATH = r"D:\Projects\new\BPGscript\input\PlanNamesFuzzy.xlsx"  # Change this to your actual path
+SHEET_A = "ExtractedData"
+SHEET_B = "DataModel"
+SHEET_ABBR = "Abb.s"
+COL_NAME_A = "Plan Name/Group Name"
+COL_NAME_B = "Plan"
+
+# Grow the DataModel to roughly this many plans with synthetic variants (0 = use as-is)
+TARGET_MODEL_SIZE = 50000
+CANDIDATE_SIZES = [50, 100, 200, 500]
+TOP_K = 3
+SCORE_THRESHOLD = 85  # recall is reported for queries whose exhaustive best match clears this
+SEED = 42
+
+# --------------------
+# LOAD DATA
+# --------------------
+print("Reading Excel file...")
+sheet_a = pd.read_excel(FILE_PATH, sheet_name=SHEET_A)
+sheet_b = pd.read_excel(FILE_PATH, sheet_name=SHEET_B)
+abbrev_df = pd.read_excel(FILE_PATH, sheet_name=SHEET_ABBR)
+normalizer = Normalizer(build_abbrev_map(abbrev_df))
+
+choices, _ = build_choices(sheet_b, COL_NAME_B, normalizer)
+
+# Synthetic variants: real plan names with a random plan code and a shuffled/dropped word,
+# which is what a larger data model mostly looks like (same carriers, more plan codes)
+rng = np.random.default_rng(SEED)
+synthetic = []
+while len(choices) + len(synthetic) < TARGET_MODEL_SIZE:
+    words = choices[rng.integers(len(choices))].split()
+    if len(words) > 2 and rng.random() < 0.5:
+        words.pop(rng.integers(len(words)))
+    rng.shuffle(words)
+    words.append(f"{rng.choice(list('abcdefghjkmnpqrstuvwxyz'))}{rng.integers(100, 9999)}")
+    synthetic.append(" ".join(words))
+choices = list(dict.fromkeys(choices + synthetic))
+
+parts = pd.Series([part for text in sheet_a[COL_NAME_A] for part in str(text).split("/")], dtype=object)
+queries = list(dict.fromkeys(normalizer.series(parts)))
+print(f"{len(queries)} unique query parts x {len(choices)} plans")
+
+# --------------------
+# EXHAUSTIVE BASELINE
+# --------------------
+# The blocked scorer runs on one core, so the like-for-like baseline is cdist with workers=1;
+# the all-cores time is what the exhaustive scorer (workers=-1) actually costs on this machine
+exhaustive_times = {}
+for workers in (1, -1):
+    start = time.perf_counter()
+    score_top_k(queries, choices, TOP_K, workers=workers)
+    exhaustive_times[workers] = time.perf_counter() - start
+print(f"\nExhaustive cdist: {exhaustive_times[1]:.2f}s on 1 core, "
+      f"{exhaustive_times[-1]:.2f}s on all cores ({os.cpu_count()})")
+
+# --------------------
+# BLOCKED RUNS
+# --------------------
+rows = []
+for candidates in CANDIDATE_SIZES:
+    start = time.perf_counter()
+    index = CandidateIndex(choices, candidates=candidates)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    score_top_k_blocked(queries, index, TOP_K)
+    blocked_time = time.perf_counter() - start
+
+    recall_all = measure_recall(queries, choices, index, k=TOP_K)
+    recall = measure_recall(queries, choices, index, k=TOP_K, min_score=SCORE_THRESHOLD)
+    rows.append({
+        "Candidates": candidates,
+        "Index Build (s)": round(build_time, 2),
+        "Match (s)": round(blocked_time, 2),
+        "Speedup (1 core)": round(exhaustive_times[1] / blocked_time, 1),
+        "Speedup (vs all cores)": round(exhaustive_times[-1] / blocked_time, 1),
+        f"Top-1 Recall (>={SCORE_THRESHOLD})": round(recall["top1_recall"], 4),
+        f"Top-{TOP_K} Recall (>={SCORE_THRESHOLD})": round(recall["topk_recall"], 4),
+        "Top-1 Recall (all)": round(recall_all["top1_recall"], 4),
+    })
+
+print()
+print(pd.DataFrame(rows).to_string(index=False))
@@ -1,82 +1,260 @@
+import os
 import pandas as pd
-import re
+import numpy as np
 from openpyxl import load_workbook
+from bpg_keys import parse_bin
 
 # ----------------------
 # CONFIGURATION
 # ----------------------
 INPUT_FILE = r'D:\Projects\new\BPGscript\output\payer_data_020725.xlsx'
-SHEET_NAME_OUT = 'CleanedOutput'
+INPUT_SHEET = 'Extracted Data'
+
+# The raw extraction workbook is never modified; cleaned rows go to a separate artifact
+OUTPUT_FORMAT = 'parquet'  # 'parquet' or 'csv'
+OUTPUT_FILE = os.path.splitext(INPUT_FILE)[0] + '_cleaned.' + OUTPUT_FORMAT
+REPORT_FILE = os.path.splitext(INPUT_FILE)[0] + '_explode_report.csv'
+
+# Rows read, cleaned and written per chunk (keeps memory bounded on large extractions)
+CHUNK_SIZE = 20000
+
+# 'zip'       -> pair BIN/PCN/GRP values by position (single values are repeated);
+#                rows whose list lengths don't line up are kept as-is and reported
+# 'cartesian' -> every BIN x PCN x GRP combination (the old behaviour)
+EXPLODE_MODE = 'zip'
+# Rows that would expand into more than this many output rows are kept as-is and reported
+MAX_ROWS_PER_SOURCE = 50
+# Parquet only: PCN/GRP dictionary-encoded, plus a BIN_key column (BIN as uint32, empty unless
+# the cell is a single number) for joining; BIN/PCN/GRP text is kept exactly as cleaned
+COMPACT_KEYS = True
 
 # ----------------------
-# STEP 1: LOAD DATA
+# STEP 1: LOAD DATA (streamed in chunks)
 # ----------------------
-INPUT_SHEET = 'Extracted Data'
-df = pd.read_excel(INPUT_FILE, sheet_name=INPUT_SHEET)
+# Same placeholder strings pd.read_excel treats as missing
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+             '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+def iter_input_chunks(path, sheet_name, chunk_size):
+    """Yield DataFrames of at most `chunk_size` rows, indexed by their row number in the source."""
+    ext = os.path.splitext(path)[1].lower()
+    offset = 0
+
+    if ext == '.csv':
+        for chunk in pd.read_csv(path, chunksize=chunk_size, dtype=str):
+            chunk.index = range(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+        return
+
+    # openpyxl read-only mode streams rows instead of loading the whole sheet
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(h) if h is not None else f'Unnamed: {i}' for i, h in enumerate(header)]
+
+        def to_frame(buffer):
+            chunk = pd.DataFrame(buffer, columns=columns, index=range(offset, offset + len(buffer)))
+            return chunk.replace(NA_VALUES, np.nan)
+
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield to_frame(buffer)
+                offset += len(buffer)
+                buffer = []
+        if buffer:
+            yield to_frame(buffer)
+    finally:
+        wb.close()
 
 # ----------------------
 # STEP 2: CLEAN & SPLIT VALUES
 # ----------------------
 split_cols = ['BIN', 'PCN', 'GRP']
+list_cols = [col + '_list' for col in split_cols]
 
-def clean_cell(value):
-    if pd.isna(value):
-        return []
-
-    value = str(value)
-    
-    # Remove text like "(or as appears on card)" or anything after "or"
-    value = re.sub(r'\bor\b.*', '', value, flags=re.IGNORECASE)
-    value = re.sub(r'\(.*?\)', '', value)
+def empty_lists(index, fill=None):
+    """Series of empty lists (or single-item lists of `fill`) aligned to `index`."""
+    return pd.Series([[] if fill is None else [fill] for _ in range(len(index))], index=index, dtype=object)
 
-    # Replace slashes with commas
-    value = value.replace('/', ',')
+def clean_column(series):
+    """Vectorized clean + split of a BIN/PCN/GRP column into lists of values."""
+    s = series.astype('string')
 
-    # Normalize all separators to comma
-    value = re.sub(r'[ ,]+', ',', value)
-    
-    value = value.strip(', ')
-    
-    # Check if the cleaned value is empty
-    if not value:
-        return []
+    # Remove text like "(or as appears on card)" or anything after "or"
+    s = s.str.replace(r'(?i)\bor\b.*', '', regex=True)
+    s = s.str.replace(r'\(.*?\)', '', regex=True)
 
-    return [v.strip() for v in value.split(',') if v.strip()]
+    # Replace slashes with commas and normalize all separators to comma
+    s = s.str.replace('/', ',', regex=False)
+    s = s.str.replace(r'\s*[ ,]+\s*', ',', regex=True)
+    s = s.str.strip(', \t\r\n')
 
-# Apply to BIN/PCN/GRP
-for col in split_cols:
-    df[col + '_list'] = df[col].apply(clean_cell)
+    # Empty / missing cells become empty lists
+    s = s.fillna('')
+    return s.str.split(',').where(s != '', empty_lists(s.index))
 
 # ----------------------
-# STEP 3: EXPLODE
+# STEP 3: EXPLODE (zip / cartesian with row-blowup cap)
 # ----------------------
-df = df.explode('BIN_list').explode('PCN_list').explode('GRP_list')
+def explode_chunk(df):
+    """Explode the BIN/PCN/GRP lists of one chunk. Returns (exploded rows, report of rows kept as-is)."""
+    for col in split_cols:
+        df[col + '_list'] = clean_column(df[col])
+
+    lengths = pd.DataFrame({col: df[col].str.len() for col in list_cols})
+    widths = lengths.clip(lower=1)
+    longest = widths.max(axis=1)
+
+    # zip is only possible when every list is empty, a single value, or the same length
+    zippable = (widths.eq(1) | widths.eq(longest, axis=0)).all(axis=1)
+
+    if EXPLODE_MODE == 'zip':
+        rows_out = longest
+        explodable = zippable
+    else:
+        rows_out = widths.prod(axis=1)
+        explodable = pd.Series(True, index=df.index)
 
-# Replace original values
-df['BIN'] = df['BIN_list']
-df['PCN'] = df['PCN_list']
-df['GRP'] = df['GRP_list']
-df.drop(columns=['BIN_list', 'PCN_list', 'GRP_list'], inplace=True)
+    over_cap = rows_out > MAX_ROWS_PER_SOURCE
+    keep_as_is = ~explodable | over_cap
+
+    # Report of rows that were not exploded
+    report = df.loc[keep_as_is, split_cols].copy()
+    report.insert(0, 'Source Row', report.index)
+    for col in split_cols:
+        report[col + ' Count'] = lengths.loc[keep_as_is, col + '_list']
+    report['Rows If Exploded'] = rows_out[keep_as_is]
+    report['Reason'] = np.where(over_cap[keep_as_is], 'row cap exceeded', 'list lengths differ')
+
+    # Rows kept as-is carry their cleaned values joined back into one cell
+    untouched = df[keep_as_is].copy()
+    for col in split_cols:
+        untouched[col + '_list'] = untouched[col + '_list'].str.join(', ').mask(lambda joined: joined == '')
+
+    to_explode = df[~keep_as_is].copy()
+    if EXPLODE_MODE == 'zip':
+        # Broadcast single values (and blanks) to the row's list length so the lists explode together
+        n = longest[~keep_as_is]
+        for col in list_cols:
+            values = to_explode[col].where(to_explode[col].str.len() > 0, empty_lists(to_explode.index, fill=np.nan))
+            single = values.str.len() == 1
+            values[single] = values[single] * n[single]
+            to_explode[col] = values
+        exploded = to_explode.explode(list_cols)
+    else:
+        exploded = to_explode.explode('BIN_list').explode('PCN_list').explode('GRP_list')
+
+    # Put exploded and untouched rows back in their original order
+    df = pd.concat([exploded, untouched]).sort_index(kind='stable')
+
+    # Replace original values
+    df['BIN'] = df['BIN_list']
+    df['PCN'] = df['PCN_list']
+    df['GRP'] = df['GRP_list']
+    df.drop(columns=list_cols, inplace=True)
+    return df, report
 
 # ----------------------
 # STEP 4: CONVERT SPECIAL SYMBOLS TO BLANK CELLS
 # ----------------------
-def convert_special_symbols_to_blank(value):
-    if pd.isna(value):
-        return value
-    value = str(value)
-    if re.match(r'^[#&\\-:]+$', value):
-        return ''
-    return value
-
-# Apply to all columns
-for col in df.columns:
-    df[col] = df[col].apply(convert_special_symbols_to_blank)
+# Cells made up only of '#', '&', '\', '-' or ':' are placeholder symbols, not values
+SPECIAL_SYMBOLS = r'[#&\\:-]+'
+
+def blank_special_symbols(df):
+    # Every column is written as text so each chunk has the same schema in the output file
+    df = df.astype('string')
+    for col in df.columns:
+        is_symbol = df[col].str.fullmatch(SPECIAL_SYMBOLS).fillna(False).astype(bool)
+        df.loc[is_symbol, col] = ''
+    return df
+
+def compact_keys(df):
+    """See COMPACT_KEYS: adds BIN_key after BIN and turns PCN/GRP into categoricals."""
+    df = df.copy()
+    df.insert(df.columns.get_loc('BIN') + 1, 'BIN_key', parse_bin(df['BIN']))
+    for col in ['PCN', 'GRP']:
+        df[col] = df[col].astype('category')
+    return df
 
 # ----------------------
-# STEP 5: WRITE TO NEW SHEET IN SAME FILE
+# STEP 5: WRITE TO A SEPARATE ARTIFACT
 # ----------------------
-with pd.ExcelWriter(INPUT_FILE, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-    df.to_excel(writer, sheet_name=SHEET_NAME_OUT, index=False)
+class ChunkWriter:
+    """Append cleaned chunks to a temp file; `close()` moves it into place so a failed run never leaves a partial artifact."""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.tmp_path = path + '.tmp'
+        self.rows = 0
+        self._parquet = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def write(self, df):
+        if self.fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                # Categorical code widths vary chunk to chunk; fix dictionary indices at int32 so every chunk fits
+                schema = pa.schema([
+                    field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                    if pa.types.is_dictionary(field.type) else field
+                    for field in table.schema
+                ], metadata=table.schema.metadata)
+                self._parquet = pq.ParquetWriter(self.tmp_path, schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            df.to_csv(self.tmp_path, index=False, mode='a', header=self.rows == 0)
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if os.path.exists(self.tmp_path):
+            os.replace(self.tmp_path, self.path)
+
+def main():
+    if EXPLODE_MODE not in ('zip', 'cartesian'):
+        raise ValueError(f"❌ Unknown EXPLODE_MODE '{EXPLODE_MODE}'. Use 'zip' or 'cartesian'.")
+    if OUTPUT_FORMAT not in ('parquet', 'csv'):
+        raise ValueError(f"❌ Unknown OUTPUT_FORMAT '{OUTPUT_FORMAT}'. Use 'parquet' or 'csv'.")
+
+    writer = ChunkWriter(OUTPUT_FILE, OUTPUT_FORMAT)
+    compact = COMPACT_KEYS and OUTPUT_FORMAT == 'parquet'
+    reports = []
+    rows_in = 0
+    bins_not_numeric = 0
+
+    for chunk_num, chunk in enumerate(iter_input_chunks(INPUT_FILE, INPUT_SHEET, CHUNK_SIZE), start=1):
+        cleaned, report = explode_chunk(chunk)
+        cleaned = blank_special_symbols(cleaned)
+        if compact:
+            cleaned = compact_keys(cleaned)
+            bins_not_numeric += int((cleaned['BIN_key'].isna() & cleaned['BIN'].fillna('').str.strip().ne('')).sum())
+        writer.write(cleaned)
+        reports.append(report)
+        rows_in += len(chunk)
+        print(f"🔄 Chunk {chunk_num}: {len(chunk)} rows in → {len(cleaned)} rows out")
+
+    writer.close()
+
+    report = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
+    report.to_csv(REPORT_FILE, index=False)
+
+    print(f"✅ Cleaned and exploded BIN/PCN/GRP columns ({EXPLODE_MODE} mode): {rows_in} rows → {writer.rows} rows.")
+    print(f"   Output written to: {OUTPUT_FILE}")
+    if not report.empty:
+        print(f"⚠️  {len(report)} rows were kept unexploded (see {REPORT_FILE}).")
+    if bins_not_numeric:
+        print(f"⚠️  {bins_not_numeric} rows have a BIN that isn't a single number; their BIN_key is empty.")
 
-print(f"✅ Cleaned and exploded BIN/PCN/GRP columns. Output written to '{SHEET_NAME_OUT}' in the same file.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,37 @@
+import statistics
 import subprocess
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# -------- Ollama settings --------
+OLLAMA_URL = "http://localhost:11434"
+MODEL = "llama3.1:8b"
+KEEP_ALIVE = "30m"          # how long the server keeps the model loaded after a call
+PARALLEL_REQUESTS = 1       # concurrent requests; match the server's OLLAMA_NUM_PARALLEL
+TIMEOUT = 300
+CHARS_PER_TOKEN = 4         # rough estimate, for sizing the context window
+REPLY_TOKENS = 512          # room left in the context for the answer table
+NUM_CTX_MIN = 2048
+NUM_CTX_MAX = 32768
+
+
+def num_ctx_for(prompt):
+    """
+    Context window for a prompt: its estimated tokens plus the reply, rounded up to a power of two.
+    Rounding keeps the number of distinct sizes small -- Ollama reloads the model when num_ctx changes.
+    """
+    needed = len(prompt) // CHARS_PER_TOKEN + REPLY_TOKENS
+    num_ctx = NUM_CTX_MIN
+    while num_ctx < needed and num_ctx < NUM_CTX_MAX:
+        num_ctx *= 2
+    return num_ctx
+
 
 # -------- Ask Ollama to Extract Info --------
-def ask_ollama(text, known_bin, known_pcn, known_group):
-    prompt = f"""
+def build_prompt(text, known_bin, known_pcn, known_group):
+    return f"""
 You are a data extraction assistant. From the PDF text below, identify sets of related information for pharmacy benefit plans.
 
 Extract the following fields when available:
@@ -29,13 +58,84 @@ BIN | PCN | Group ID | Plan Type | Comments
 Text:
 {text}
 """
+
+
+class OllamaClient:
+    """
+    Ollama's HTTP chat API over one keep-alive session, so the model stays loaded between calls
+    (`keep_alive`) instead of `ollama run` starting a process for each PDF. Safe to share between
+    threads; records each call's latency and the server's model load time for comparison.
+    """
+
+    def __init__(self, url=OLLAMA_URL, model=MODEL, keep_alive=KEEP_ALIVE, timeout=TIMEOUT):
+        self.url, self.model, self.keep_alive, self.timeout = url.rstrip("/"), model, keep_alive, timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(PARALLEL_REQUESTS, 1))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.load_times = []
+
+    def chat(self, prompt):
+        """The model's reply to one user message."""
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {"num_ctx": num_ctx_for(prompt)},
+        }
+        start = time.perf_counter()
+        r = self.session.post(f"{self.url}/api/chat", json=payload, timeout=self.timeout)
+        r.raise_for_status()
+        reply = r.json()
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+            self.load_times.append(reply.get("load_duration", 0) / 1e9)  # reported in nanoseconds
+        return reply["message"]["content"]
+
+    def summary(self):
+        """One line of per-call latency and model load time, to compare with `ollama run` per call."""
+        if not self.latencies:
+            return "Ollama: no calls"
+        latencies = sorted(self.latencies)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        return (f"Ollama: {len(latencies)} calls, per call mean {statistics.mean(latencies):.2f}s / p95 {p95:.2f}s, "
+                f"model loading {sum(self.load_times):.1f}s in total")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """The OllamaClient shared by every ask_ollama call."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
+
+def ask_ollama(text, known_bin, known_pcn, known_group, client=None):
+    """The LLM's answer table for one PDF's text, via the HTTP API ("" on failure)."""
+    try:
+        return (client or get_client()).chat(build_prompt(text, known_bin, known_pcn, known_group))
+    except Exception as e:
+        print(f"Ollama call failed: {e}")
+        return ""
+
+
+def ask_ollama_cli(text, known_bin, known_pcn, known_group):
+    """The same request through `ollama run`, one process per call (the old path; for comparison)."""
+    prompt = build_prompt(text, known_bin, known_pcn, known_group)
     try:
         result = subprocess.run(
-            ["ollama", "run", "llama3.1:8b"],
+            ["ollama", "run", MODEL],
             input=prompt.encode(),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            timeout=300
+            timeout=TIMEOUT
         )
         if result.returncode != 0:
             print(f"Ollama error: {result.stderr.decode()}")
@@ -0,0 +1,140 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import quote
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from pdf import SEARCH_URL, RESULT_SELECTOR, USER_AGENT, pdf_links_from
+
+# -------- Pool settings --------
+POOL_SIZE = 2          # pages (each in its own browser context) searching at once
+RECYCLE_AFTER = 50     # queries per page before its context is thrown away and reopened
+
+
+class _Slot:
+    """One reusable browser context + page."""
+
+    def __init__(self, context, page, generation):
+        self.context, self.page, self.generation = context, page, generation
+        self.uses = 0
+        self.broken = False
+        page.on("crash", lambda _: setattr(self, "broken", True))
+
+
+class BrowserPool:
+    """
+    One headless Chromium shared by every search, instead of a launch per query (search_pdf_links).
+    Queries run concurrently on up to `size` pages. A page is recycled (fresh context) after
+    `recycle_after` queries or once it crashed or failed; if the browser itself dies it is relaunched.
+    Use as `async with BrowserPool() as pool: links = await pool.search(query)`.
+    """
+
+    def __init__(self, size=POOL_SIZE, recycle_after=RECYCLE_AFTER, search_url=SEARCH_URL):
+        self.size, self.recycle_after, self.search_url = size, recycle_after, search_url
+        self._playwright = None
+        self._browser = None
+        self._generation = 0  # bumped on every launch; pages from an older browser are reopened
+        self._launch_lock = asyncio.Lock()
+        self._slots = asyncio.Queue()
+        # Stats for summary()
+        self.launch_times = []
+        self.latencies = []
+        self.recycled = 0
+        self.failures = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        self._playwright = await async_playwright().start()
+        await self._launch()
+        for _ in range(self.size):
+            self._slots.put_nowait(None)  # pages are opened on first use
+
+    async def close(self):
+        while not self._slots.empty():
+            slot = self._slots.get_nowait()
+            if slot is not None:
+                await self._discard(slot)
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+    async def _launch(self):
+        start = time.perf_counter()
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        self._generation += 1
+        self.launch_times.append(time.perf_counter() - start)
+
+    async def _open(self):
+        async with self._launch_lock:
+            if not self._browser.is_connected():
+                print("⚠️ Browser disconnected; relaunching.")
+                await self._launch()
+        context = await self._browser.new_context(user_agent=USER_AGENT)
+        return _Slot(context, await context.new_page(), self._generation)
+
+    async def _discard(self, slot):
+        try:
+            await slot.context.close()
+        except Exception:
+            pass  # its browser may already be gone
+
+    def _worn_out(self, slot):
+        return (slot.broken or slot.uses >= self.recycle_after
+                or slot.generation != self._generation or not self._browser.is_connected())
+
+    async def search(self, query, max_results=3):
+        """
+        Up to max_results PDF links, like search_pdf_links(query, max_results); [] when the results
+        page loaded but never showed a result (no results). A query that fails any other way -- a crash,
+        an error, the page itself timing out -- is retried once on a fresh page; if that fails too the
+        error is raised, so a failed search is never mistaken for (and cached as) no results.
+        """
+        slot = await self._slots.get()
+        start = time.perf_counter()
+        try:
+            for attempt in range(2):
+                try:
+                    if slot is not None and self._worn_out(slot):
+                        await self._discard(slot)
+                        slot = None
+                        self.recycled += 1
+                    if slot is None:
+                        slot = await self._open()
+                    slot.uses += 1
+                    return await self._query(slot.page, query, max_results)
+                except Exception as e:
+                    print(f"❌ Error in BrowserPool.search() (attempt {attempt + 1}): {e}")
+                    self.failures += 1
+                    if slot is not None:
+                        slot.broken = True
+                    if attempt == 1:
+                        raise
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+            self._slots.put_nowait(slot)
+
+    async def _query(self, page, query, max_results):
+        await page.goto(self.search_url.format(query=quote(query)), timeout=30000)  # a timeout here is a failure
+        try:
+            await page.wait_for_selector(RESULT_SELECTOR, timeout=10000)
+        except PlaywrightTimeoutError:
+            print(f"⚠️ No results on the Bing page for: {query}")
+            return []
+        anchors = await page.query_selector_all(RESULT_SELECTOR)
+        return pdf_links_from([await a.get_attribute("href") for a in anchors], max_results)
+
+    def summary(self):
+        """One line of launch cost and per-query latency, to compare with a launch per query."""
+        if not self.latencies:
+            return f"Browser pool: {len(self.launch_times)} launch(es), no queries"
+        latencies = sorted(self.latencies)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        return (f"Browser pool: {len(self.launch_times)} launch(es) ({sum(self.launch_times):.1f}s), "
+                f"{len(latencies)} queries, per query mean {statistics.mean(latencies):.2f}s / p95 {p95:.2f}s, "
+                f"{self.recycled} page(s) recycled, {self.failures} failure(s)")
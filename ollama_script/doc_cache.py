@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+# -------- Extraction cache settings --------
+TEXT_DIR = "./pdfs/text"                     # extracted text, `<md5>_<known values hash>.txt`
+ANSWER_PATH = "./output/llm_answers.jsonl"   # LLM output per PDF hash + known BIN/PCN/Group ID
+
+
+class DocumentCache:
+    """
+    Results already worked out for a PDF, keyed by its content hash (the md5 the download store and
+    DeDup.py use): its extracted text and the LLM's answer for it, per set of known values. A PDF
+    reached again, under any URL or file name, skips both text extraction and the LLM call.
+    Answers are kept in an append-only JSON-lines file; the last line for a key wins.
+    """
+
+    def __init__(self, text_dir=TEXT_DIR, answer_path=ANSWER_PATH):
+        self.text_dir = Path(text_dir)
+        self.answer_path = answer_path
+        self.answers = {}
+        self.stats = {"texts": 0, "answers": 0}
+        if os.path.exists(answer_path):
+            with open(answer_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.answers[entry["key"]] = entry["output"]
+                    except (ValueError, KeyError):
+                        print(f"⚠️ Skipping unreadable line in {answer_path}")
+
+    @staticmethod
+    def answer_key(md5, known_bin, known_pcn, known_group):
+        return "|".join([md5, known_bin or "", known_pcn or "", known_group or ""])
+
+    def text_path(self, md5, known_bin, known_pcn, known_group):
+        # The text is windowed around the known values, so it is stored per set of them
+        known = hashlib.md5(self.answer_key("", known_bin, known_pcn, known_group).encode()).hexdigest()[:8]
+        return self.text_dir / f"{md5}_{known}.txt"
+
+    def text(self, md5, known_bin, known_pcn, known_group):
+        path = self.text_path(md5, known_bin, known_pcn, known_group)
+        if not path.exists():
+            return None
+        self.stats["texts"] += 1
+        return path.read_text(encoding="utf-8")
+
+    def put_text(self, md5, known_bin, known_pcn, known_group, text):
+        self.text_dir.mkdir(parents=True, exist_ok=True)
+        path = self.text_path(md5, known_bin, known_pcn, known_group)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def answer(self, md5, known_bin, known_pcn, known_group):
+        output = self.answers.get(self.answer_key(md5, known_bin, known_pcn, known_group))
+        if output is not None:
+            self.stats["answers"] += 1
+        return output
+
+    def put_answer(self, md5, known_bin, known_pcn, known_group, output):
+        key = self.answer_key(md5, known_bin, known_pcn, known_group)
+        self.answers[key] = output
+        os.makedirs(os.path.dirname(self.answer_path) or ".", exist_ok=True)
+        with open(self.answer_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "output": output}) + "\n")
+
+    def summary(self):
+        return (f"Document cache: {self.stats['texts']} text(s) and {self.stats['answers']} LLM answer(s) "
+                f"reused by PDF hash")
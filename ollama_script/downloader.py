@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+
+# -------- Download settings --------
+DOWNLOAD_DIR = "./pdfs"
+MANIFEST_NAME = "manifest.jsonl"  # url -> content hash + ETag/Last-Modified, inside DOWNLOAD_DIR
+# DeDup.py's record of PDFs already collected (md5 -> file name in the same folder); a download whose
+# hash is listed there is served from that file instead of a second copy. None: not used
+DEDUP_CHECKPOINT = None           # e.g. r"D:\Projects\BPGscript\vol2pdfs\checkpoint_hashes.json"
+MAX_BYTES = 50 * 1024 * 1024      # larger responses are abandoned mid-stream
+CHUNK_BYTES = 64 * 1024
+HEADER_BYTES = 1024               # %PDF- has to appear within the first this many bytes
+TIMEOUT = 10                      # seconds to connect / between bytes
+FRESH_HOURS = 24                  # a file fetched this recently is used without even revalidating
+POOL_CONNECTIONS = 16             # hosts kept alive
+POOL_MAXSIZE = 4                  # open connections per host
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36"
+
+
+class DownloadError(Exception):
+    """A response that is not a usable PDF (bad status, HTML page, too large, no %PDF- header)."""
+
+
+def file_md5(path, block_size=65536):
+    """MD5 hex digest of a file, the hash DeDup.py / pdfHashes.py use for PDFs."""
+    hasher = hashlib.md5()
+    with open(path, "rb") as f:
+        while chunk := f.read(block_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def header_checked(chunks, header_bytes=HEADER_BYTES):
+    """
+    `chunks` of a response body, with the first ones held back and joined until `header_bytes` have
+    arrived (or the body ends), so the %PDF- check does not depend on how the transport splits them.
+    """
+    head = b""
+    for chunk in chunks:
+        if head is None:
+            yield chunk
+            continue
+        head += chunk
+        if len(head) >= header_bytes:
+            if b"%PDF-" not in head[:header_bytes]:
+                raise DownloadError("response does not start with a %PDF- header")
+            yield head
+            head = None
+    if head:
+        if b"%PDF-" not in head:
+            raise DownloadError("response does not start with a %PDF- header")
+        yield head
+
+
+def pdf_hash(path):
+    """Content hash of a PDF: a stored download is named after it, any other file is hashed."""
+    stem = Path(path).stem
+    return stem if re.fullmatch(r"[0-9a-f]{32}", stem) else file_md5(path)
+
+
+class Downloader:
+    """
+    PDF downloads over one keep-alive requests.Session, streamed to a temp file and renamed into place
+    only once the body is complete and looks like a PDF. Files are stored by content: `<md5>.pdf`, so
+    two URLs ending in the same file name never collide and two URLs serving the same PDF share one
+    file. The manifest maps each URL to its hash and ETag/Last-Modified; a URL seen before is
+    revalidated with a conditional GET, so an unchanged PDF costs one 304 instead of a re-download.
+    The manifest is a JSON-lines log that is only appended to (the last line for a URL wins) and
+    compacted when loaded, so recording a download does not rewrite the whole file.
+    Safe to share between threads.
+    """
+
+    def __init__(self, download_dir=DOWNLOAD_DIR, max_bytes=MAX_BYTES, fresh_hours=FRESH_HOURS,
+                 dedup_checkpoint=DEDUP_CHECKPOINT):
+        self.download_dir = Path(download_dir)
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_hours * 3600
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.lock = threading.Lock()
+        self.manifest_path = self.download_dir / MANIFEST_NAME
+        self.manifest = self._load_manifest()
+        self.known = self._load_dedup(dedup_checkpoint)
+        self.stats = {"fetched": 0, "not_modified": 0, "fresh": 0, "rejected": 0, "duplicates": 0}
+
+    def _load_manifest(self):
+        if not self.manifest_path.exists():
+            return {}
+        manifest, lines = {}, 0
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    manifest[entry.pop("url")] = entry
+                    lines += 1
+                except (ValueError, KeyError):
+                    print(f"⚠️ Skipping unreadable line in {self.manifest_path}")
+        if lines > 2 * len(manifest) + 100:
+            self._compact(manifest)
+        return manifest
+
+    def _load_dedup(self, checkpoint):
+        """md5 -> path of the PDFs in DeDup.py's checkpoint that still exist."""
+        if not checkpoint or not os.path.exists(checkpoint):
+            return {}
+        with open(checkpoint, "r") as f:
+            hashes = json.load(f)
+        folder = os.path.dirname(checkpoint)
+        known = {h: os.path.join(folder, name) for h, name in hashes.items()}
+        print(f"🔄 {len(known)} known PDF hashes from {checkpoint}")
+        return {h: path for h, path in known.items() if os.path.exists(path)}
+
+    def _compact(self, manifest):
+        """Rewrite the manifest with one line per URL, dropping the lines later ones replaced."""
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for url, entry in manifest.items():
+                f.write(json.dumps({"url": url, **entry}) + "\n")
+        os.replace(tmp_path, self.manifest_path)
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def stored_path(self, md5):
+        """Where the PDF with this hash is: DeDup's copy if it has one, else `<md5>.pdf` in the store."""
+        return Path(self.known.get(md5) or self.download_dir / f"{md5}.pdf")
+
+    def fetch(self, url):
+        """Local path of the PDF at `url`, downloading or revalidating it as needed. Raises on failure."""
+        self.download_dir.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            entry = self.manifest.get(url)
+        if entry and not (entry.get("md5") and self.stored_path(entry["md5"]).exists()):
+            entry = None  # file gone, or recorded before downloads were stored by hash
+        if entry and time.time() - entry["checked_at"] < self.fresh_seconds:
+            self._count("fresh")
+            return self.stored_path(entry["md5"])
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        with self.session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+            if r.status_code == 304 and entry:
+                self._count("not_modified")
+                self._record(url, dict(entry, checked_at=time.time()))
+                return self.stored_path(entry["md5"])
+            md5, size = self._stream(r)
+
+        self._count("fetched")
+        self._record(url, {
+            "md5": md5,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "size": size,
+            "checked_at": time.time(),
+        })
+        return self.stored_path(md5)
+
+    def _stream(self, r):
+        """Store the body of `r` under its hash via a temp file, checking it is a PDF. Returns (md5, size)."""
+        try:
+            if r.status_code != 200:
+                raise DownloadError(f"HTTP {r.status_code}")
+            content_type = r.headers.get("Content-Type", "").lower()
+            if "html" in content_type:
+                raise DownloadError(f"got {content_type} instead of a PDF")
+            length = r.headers.get("Content-Length")
+            if length and int(length) > self.max_bytes:
+                raise DownloadError(f"{int(length)} bytes is over the {self.max_bytes} byte limit")
+        except DownloadError:
+            self._count("rejected")
+            raise
+
+        tmp_path = self.download_dir / f"download.{threading.get_ident()}.part"
+        hasher = hashlib.md5()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in header_checked(r.iter_content(CHUNK_BYTES)):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise DownloadError(f"over the {self.max_bytes} byte limit")
+                    hasher.update(chunk)
+                    f.write(chunk)
+            if size == 0:
+                raise DownloadError("empty response")
+            md5 = hasher.hexdigest()
+            if self.stored_path(md5).exists():
+                self._count("duplicates")  # same PDF as another URL, or in DeDup's checkpoint
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, self.stored_path(md5))
+        except BaseException as e:
+            if isinstance(e, DownloadError):
+                self._count("rejected")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return md5, size
+
+    def _record(self, url, entry):
+        with self.lock:
+            self.manifest[url] = entry
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"url": url, **entry}) + "\n")
+
+    def summary(self):
+        s = self.stats
+        return (f"Downloads: {s['fetched']} fetched ({s['duplicates']} already stored or known to DeDup), "
+                f"{s['not_modified']} unchanged (304), {s['fresh']} reused without a request, {s['rejected']} rejected")
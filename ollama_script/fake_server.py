@@ -0,0 +1,206 @@
+import json
+import re
+import time
+import hashlib
+import threading
+from html import escape
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote
+
+# Local stand-in for Bing, the PDF hosts and the Ollama server, for testing pipeline throughput
+# offline. Each endpoint waits a configurable delay to model network and model latency:
+#   GET  /search?q=<query>  Bing-like results page (li.b_algo a) linking to PDFs on this server
+#   GET  /pdf/<doc>.pdf     a small generated PDF mentioning the BIN/PCN/Group ID of its query, with an
+#                           ETag/Last-Modified (304 on a matching conditional GET); every `html_every`-th
+#                           document is an HTML "access denied" page instead, like some payer sites
+#   POST /api/chat          Ollama chat API; answers a table row per known group ID in the prompt,
+#                           at most `llm_parallel` at a time (like OLLAMA_NUM_PARALLEL)
+
+# --- CONFIGURATION --- (defaults for `python fake_server.py`)
+PORT = 8765
+SEARCH_DELAY = 1.0
+DOWNLOAD_DELAY = 0.5
+LLM_DELAY = 3.0
+LLM_PARALLEL = 1
+LINKS_PER_QUERY = 3
+PAGES_PER_PDF = 3
+HTML_EVERY = 0          # 0: every document is a PDF
+
+
+def pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages):
+    """Minimal valid PDF: one Helvetica text page per entry of `pages` (each a list of lines)."""
+    page_ids = [3 + 2 * i for i in range(len(pages))]
+    font_id = 3 + 2 * len(pages)
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(pages)} >>",
+        font_id: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for page_id, lines in zip(page_ids, pages):
+        stream = "BT /F1 10 Tf 14 TL 72 760 Td " + " ".join(f"({pdf_escape(line)}) '" for line in lines) + " ET"
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {page_id + 1} 0 R >>")
+        objects[page_id + 1] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for obj_id in range(1, len(objects) + 1):
+        offsets.append(len(out))
+        out += f"{obj_id} 0 obj\n{objects[obj_id]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def query_values(query):
+    """BIN / PCN / GroupID named in a pipeline search query (None when absent)."""
+    return {key: (re.search(rf"\b{key} (\S+)", query) or [None, None])[1] for key in ["BIN", "PCN", "GroupID"]}
+
+
+class FakeServer:
+    """
+    Threaded fake search/PDF/LLM server on 127.0.0.1. Use as a context manager:
+        with FakeServer(llm_delay=1.0) as server:
+            search_pdf_links(query, search_url=server.search_url)
+    """
+
+    def __init__(self, port=0, search_delay=SEARCH_DELAY, download_delay=DOWNLOAD_DELAY, llm_delay=LLM_DELAY,
+                 llm_parallel=LLM_PARALLEL, links_per_query=LINKS_PER_QUERY, pages_per_pdf=PAGES_PER_PDF,
+                 html_every=HTML_EVERY):
+        self.search_delay, self.download_delay, self.llm_delay = search_delay, download_delay, llm_delay
+        self.links_per_query, self.pages_per_pdf, self.html_every = links_per_query, pages_per_pdf, html_every
+        self.last_modified = formatdate(time.time(), usegmt=True)
+        self.llm_slots = threading.Semaphore(llm_parallel)
+        self.documents = {}  # doc id -> query it was listed for
+        self.requests = {"search": 0, "pdf": 0, "not_modified": 0, "llm": 0}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.search_url = self.url + "/search?q={query}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self, kind):
+        with self.lock:
+            self.requests[kind] += 1
+
+    # -------- Responses --------
+    def search_page(self, query):
+        items = []
+        for i in range(self.links_per_query):
+            # Per-server ids: two servers never hand out the same URL (downloads are remembered by URL)
+            doc = hashlib.sha1(f"{self.url}|{query}|{i}".encode()).hexdigest()[:12]
+            self.documents[doc] = query
+            items.append(f'<li class="b_algo"><h2><a href="{self.url}/pdf/{doc}.pdf">Payer sheet {i + 1}</a></h2></li>')
+        return f"<html><body><ol id=\"b_results\">{''.join(items)}</ol><p>{escape(query)}</p></body></html>"
+
+    def is_html_error(self, doc):
+        docs = list(self.documents)
+        return bool(self.html_every) and doc in self.documents and (docs.index(doc) + 1) % self.html_every == 0
+
+    def pdf_document(self, doc):
+        values = query_values(self.documents.get(doc, ""))
+        anchor = [f"BIN: {values['BIN'] or '-'}   PCN: {values['PCN'] or '-'}   Group ID: {values['GroupID'] or '-'}",
+                  "Plan Type: Medicare Part D"]
+        filler = [f"Section {n}: pharmacy benefit terms and member services information." for n in range(40)]
+        pages = [filler[:]] * (self.pages_per_pdf - 1) + [filler[:10] + anchor + filler[10:]]
+        return make_pdf(pages)
+
+    def chat_reply(self, body):
+        prompt = " ".join(message.get("content", "") for message in body.get("messages", []))
+        known = {key: (re.search(rf"Known {key}: ([^\n]+)", prompt) or [None, "N/A"])[1].strip()
+                 for key in ["BIN", "PCN", "Group ID"]}
+        # One row per known group ID (a BIN/PCN group sends them comma-separated)
+        content = "BIN | PCN | Group ID | Plan Type | Comments\n" + "\n".join(
+            f"{known['BIN']} | {known['PCN']} | {group} | Medicare Part D | Fake extraction"
+            for group in known['Group ID'].split(", "))
+        return {"model": body.get("model", ""), "message": {"role": "assistant", "content": content}, "done": True}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real servers
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/search":
+                    server._count("search")
+                    time.sleep(server.search_delay)
+                    query = parse_qs(url.query).get("q", [""])[0]
+                    self._send(200, server.search_page(query).encode(), "text/html; charset=utf-8")
+                elif url.path.startswith("/pdf/") and url.path.endswith(".pdf"):
+                    doc = url.path[len("/pdf/"):-len(".pdf")]
+                    if server.is_html_error(doc):
+                        server._count("pdf")
+                        self._send(200, b"<html><body>Access denied</body></html>", "text/html")
+                        return
+                    body = server.pdf_document(doc)
+                    etag = f'"{hashlib.md5(body).hexdigest()}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        server._count("not_modified")
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.end_headers()
+                        return
+                    server._count("pdf")
+                    time.sleep(server.download_delay)
+                    self._send(200, body, "application/pdf", {"ETag": etag, "Last-Modified": server.last_modified})
+                else:
+                    self._send(404, b"<html><body>Not found</body></html>", "text/html")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if urlparse(self.path).path != "/api/chat":
+                    self._send(404, b'{"error": "not found"}', "application/json")
+                    return
+                server._count("llm")
+                with server.llm_slots:
+                    time.sleep(server.llm_delay)
+                self._send(200, json.dumps(server.chat_reply(body)).encode(), "application/json")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    server = FakeServer(port=PORT)
+    print(f"🔄 Fake server on {server.url}")
+    print(f"   search: {server.search_url.format(query=quote('BIN 004336 PCN ADV filetype:pdf'))}")
+    print(f"   ollama: {server.url}/api/chat")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
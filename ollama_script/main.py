@@ -1,11 +1,6 @@
-import os
 import pandas as pd
-from tqdm import tqdm
-from openpyxl import Workbook, load_workbook
-import os
-from parse import parse_bpg, parse_llm_output
-from ask_ollama import ask_ollama
-from pdf import search_pdf_links, download_pdf, extract_text_from_pdf
+from pipeline import run_pipeline
+from results_writer import ResultsWriter
 
 # -------- Main --------
 # def main():
@@ -78,7 +73,8 @@ from pdf import search_pdf_links, download_pdf, extract_text_from_pdf
 
 
 #===================
-# line-by-line
+# staged pipeline (pipeline.py): searches, downloads, text extraction and LLM calls run
+# concurrently, each with its own limit; rows are still written in BPG order
 # ==================
 def main():
     df = pd.read_excel("./input/BPG.xlsx", header=None)
@@ -89,82 +85,12 @@ def main():
 
     output_path = "./output/BPG_output_CT.xlsx"
 
-    # Load existing file or create a new workbook
-    if os.path.exists(output_path):
-        wb = load_workbook(output_path)
-        ws = wb.active
-    else:
-        wb = Workbook()
-        ws = wb.active
-        ws.append(["BIN", "PCN", "GroupID", "Plan Type", "Comments", "PDF Link", "Status"])
-        wb.save(output_path)
-
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Processing BPGs"):
-        bpg_data = parse_bpg(row["BPG"])
-        query = " ".join([
-            f"BIN {bpg_data['BIN']}" if bpg_data['BIN'] else "",
-            f"PCN {bpg_data['PCN']}" if bpg_data['PCN'] else "",
-            f"GroupID {bpg_data['GroupID']}" if bpg_data['GroupID'] else "",
-            "filetype:pdf"
-        ]).strip()
-
-        tqdm.write(f"\n[{idx + 1}] 🔍 Searching for: {query}")
-
-        try:
-            pdf_links = search_pdf_links(query)
-        except Exception as e:
-            tqdm.write(f"❌ Error during search: {e}")
-            ws.append([bpg_data['BIN'], bpg_data['PCN'], bpg_data['GroupID'], "", "Search error", "", "❌ Search failed"])
-            wb.save(output_path)
-            continue
-
-        if not pdf_links:
-            ws.append([bpg_data['BIN'], bpg_data['PCN'], bpg_data['GroupID'], "", "No PDFs found", "", "❌ No PDF"])
-            wb.save(output_path)
-            continue
-
-        processed = False
-        for link in pdf_links:
-            tqdm.write(f"➡️  Trying PDF: {link}")
-            pdf_path = download_pdf(link)
-            if not pdf_path:
-                tqdm.write("⚠️  PDF download failed.")
-                continue
-
-            text = extract_text_from_pdf(pdf_path)
-            if not text:
-                tqdm.write("⚠️  PDF text extraction failed.")
-                continue
-
-            llm_output = ask_ollama(text, bpg_data['BIN'], bpg_data['PCN'], bpg_data['GroupID'])
-            if not llm_output.strip():
-                tqdm.write("⚠️  LLM output was empty.")
-                continue
-
-            rows = parse_llm_output(llm_output)
-            if not rows:
-                tqdm.write("⚠️  LLM output could not be parsed.")
-                continue
-
-            for r in rows:
-                r[5] = link  # PDF link
-                if all([r[0], r[1], r[2], r[3]]):
-                    status = "✅ Success"
-                elif any([r[0], r[1], r[2], r[3]]):
-                    status = "⚠️ Partial extraction"
-                else:
-                    status = "⚠️ No usable info"
-                r.append(status)
-                ws.append(r)
-
-            wb.save(output_path)
-            processed = True
-            break  # Exit after first valid PDF
-
-        if not processed:
-            ws.append([bpg_data['BIN'], bpg_data['PCN'], bpg_data['GroupID'], "", "No usable PDF found", "", "⚠️ No usable info"])
-            wb.save(output_path)
-
+    # Appends to the existing file; rows are journaled as they come and the workbook saved every
+    # SAVE_EVERY rows, instead of re-saving it after each BPG
+    header = ["BIN", "PCN", "GroupID", "Plan Type", "Comments", "PDF Link", "Status"]
+    with ResultsWriter(output_path, header) as writer:
+        busy = run_pipeline(df["BPG"], writer.write)
+    print("\n⏱️  Time spent per stage (summed over workers): " + ", ".join(f"{stage} {sec:.1f}s" for stage, sec in busy.items()))
     print(f"\n✅ All BPGs processed. Results saved to: {output_path}")
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ask_ollama import OllamaClient, ask_ollama, ask_ollama_cli, PARALLEL_REQUESTS
+from pdf import extract_text_from_pdf
+
+# Per-call LLM latency: `ollama run` per call (the old ask_ollama) against the HTTP API with the model
+# kept loaded, one call at a time and PARALLEL_REQUESTS at a time. Needs a local Ollama server with
+# the model pulled; start it with OLLAMA_NUM_PARALLEL=PARALLEL_REQUESTS for the parallel run.
+
+# --- CONFIGURATION ---
+PDF_PATH = "../trial_pdfs/pdf_3.pdf"
+N_CALLS = 5
+KNOWN_BIN, KNOWN_PCN, KNOWN_GROUP = None, None, None
+
+
+def describe(name, latencies, wall):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"  {name:<26} per call mean {statistics.mean(latencies):6.2f}s  p95 {p95:6.2f}s   "
+          f"all {len(latencies)} calls {wall:7.1f}s")
+
+
+def timed(ask, text):
+    start = time.perf_counter()
+    output = ask(text, KNOWN_BIN, KNOWN_PCN, KNOWN_GROUP)
+    return time.perf_counter() - start, output
+
+
+def run(ask, text, parallel=1):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        results = list(pool.map(lambda _: timed(ask, text), range(N_CALLS)))
+    empty = sum(not output.strip() for _, output in results)
+    if empty:
+        print(f"⚠️ {empty} of {N_CALLS} calls returned nothing")
+    return [seconds for seconds, _ in results], time.perf_counter() - start
+
+
+def main():
+    text = extract_text_from_pdf(PDF_PATH)
+    if not text:
+        print(f"❌ No text from {PDF_PATH}")
+        return
+
+    client = OllamaClient()
+    http = lambda *args: ask_ollama(*args, client=client)
+    timed(http, text)  # warm-up: load the model once, as a long run would
+    client.latencies.clear()
+
+    results = {
+        "ollama run per call": run(ask_ollama_cli, text),
+        "HTTP, model kept loaded": run(http, text),
+        f"HTTP, {PARALLEL_REQUESTS} in parallel": run(http, text, PARALLEL_REQUESTS),
+    }
+
+    print(f"\n{N_CALLS} calls each, {len(text)} characters of PDF text")
+    for name, (latencies, wall) in results.items():
+        describe(name, latencies, wall)
+    print(f"  {client.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,50 @@
-import requests
 import os
+import re
+import threading
 import fitz  # PyMuPDF
 from urllib.parse import quote
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from downloader import Downloader
+
+# Search results page; fake_server.py serves the same markup for offline runs
+SEARCH_URL = "https://www.bing.com/search?q={query}"
+RESULT_SELECTOR = "li.b_algo a"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36"
+
+# Prompt text: windows around the known values, up to a token budget (was the first 6000 characters)
+CONTEXT_TOKENS = 1500
+CHARS_PER_TOKEN = 4       # rough estimate
+WINDOW_CHARS = 600        # text kept on either side of a hit
+
+# -------- PDF links on a results page --------
+def pdf_links_from(hrefs, max_results=3):
+    """The first `max_results` absolute PDF links among a results page's anchor hrefs."""
+    links = []
+    for href in hrefs:
+        if href and ".pdf" in href.lower() and href.startswith("http"):
+            links.append(href)
+            if len(links) >= max_results:
+                break
+    return links
 
 # -------- Search Google for PDFs --------
-def search_pdf_links(query, max_results=3):
+def search_pdf_links(query, max_results=3, search_url=SEARCH_URL):
     links = []
     try:
         with sync_playwright() as p:
             browser = p.chromium.launch(headless=True)
-            context = browser.new_context(user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36")
+            context = browser.new_context(user_agent=USER_AGENT)
             page = context.new_page()
 
             try:
-                page.goto(f"https://www.bing.com/search?q={quote(query)}", timeout=30000)
-                page.wait_for_selector("li.b_algo a", timeout=10000)
+                page.goto(search_url.format(query=quote(query)), timeout=30000)
+                page.wait_for_selector(RESULT_SELECTOR, timeout=10000)
             except PlaywrightTimeoutError:
                 print(f"⚠️ Timeout during Bing search for: {query}")
                 return []
 
-            anchors = page.query_selector_all("li.b_algo a")
-            for a in anchors:
-                href = a.get_attribute("href")
-                if href and ".pdf" in href.lower() and href.startswith("http"):
-                    links.append(href)
-                    if len(links) >= max_results:
-                        break
+            anchors = page.query_selector_all(RESULT_SELECTOR)
+            links = pdf_links_from([a.get_attribute("href") for a in anchors], max_results)
 
             browser.close()
     except Exception as e:
@@ -36,34 +54,102 @@ def search_pdf_links(query, max_results=3):
     return links
 
 # -------- Download PDF --------
+_downloader = None
+_downloader_lock = threading.Lock()
+
+def get_downloader():
+    """The Downloader shared by every download_pdf call (one session, one manifest)."""
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = Downloader()
+        return _downloader
+
 def download_pdf(url):
     try:
-        os.makedirs("pdfs", exist_ok=True)
-        from pathlib import Path
-        filename = Path("./pdfs") / Path(url).name.split("?")[0]
-
-        if os.path.exists(filename):
-            return filename
-        r = requests.get(url, timeout=10)
-        with open(filename, "wb") as f:
-            f.write(r.content)
-        return filename
+        return get_downloader().fetch(url)
     except Exception as e:
         print(f"Download failed for {url}: {e}")
         return None
 
 # -------- Extract Text from PDF --------
-def extract_text_from_pdf(path):
-    text = ""
+def anchor_values(anchors):
+    """The known values worth searching for, lower-cased (single characters would match anywhere)."""
+    return {str(a).strip().lower() for a in anchors if a and len(str(a).strip()) >= 2}
+
+
+def anchor_pattern(values):
+    """Regex matching any of `values` as a whole token, case-insensitive."""
+    values = sorted(values, key=len, reverse=True)
+    return re.compile(r"(?<![A-Za-z0-9])(" + "|".join(map(re.escape, values)) + r")(?![A-Za-z0-9])", re.IGNORECASE)
+
+
+def page_windows(text, pattern, window=WINDOW_CHARS):
+    """[start, end, anchors found] spans of a page's text around its anchor hits, overlapping spans merged."""
+    spans = []
+    for m in pattern.finditer(text):
+        start, end = max(m.start() - window, 0), min(m.end() + window, len(text))
+        # Widen to whole lines when a line break is near, so the LLM does not get cut-off values
+        line_start, line_end = text.rfind("\n", 0, start) + 1, text.find("\n", end)
+        start = line_start if start - line_start <= window // 4 else start
+        end = line_end if 0 <= line_end - end <= window // 4 else end
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+            spans[-1][2].add(m.group(1).lower())
+        else:
+            spans.append([start, end, {m.group(1).lower()}])
+    return spans
+
+
+def select_context(pages, anchors, budget=CONTEXT_TOKENS * CHARS_PER_TOKEN, window=WINDOW_CHARS):
+    """
+    The text to send the LLM from an iterable of page texts: windows around hits of the known
+    BIN/PCN/Group ID, the ones containing the most distinct known values first, up to `budget`
+    characters and joined in page order. Pages are read only until the windows so far fill the budget
+    and every known value has turned up in one of them -- not necessarily together: a group's Group
+    IDs are usually listed apart. Without known values, or hits, it is the leading text as before.
+    """
+    values = anchor_values(anchors)
+    pattern = anchor_pattern(values) if values else None
+    windows = []  # (distinct anchors, page, start, text)
+    head, head_len = [], 0
+    covered, collected = set(), 0
+    for page_no, text in enumerate(pages):
+        if head_len < budget:
+            head.append(text)
+            head_len += len(text)
+        if pattern is None:
+            if head_len >= budget:
+                break
+            continue
+        for start, end, found in page_windows(text, pattern, window):
+            windows.append((len(found), page_no, start, text[start:end]))
+            covered |= found
+            collected += end - start
+        if collected >= budget and covered == values:
+            break  # every known value found and the budget filled; the rest of the PDF is never read
+
+    if not windows:
+        return "".join(head)[:budget]
+    chosen, used = [], 0
+    for found, page_no, start, text in sorted(windows, key=lambda w: (-w[0], w[1], w[2])):
+        text = text[:budget - used]
+        chosen.append((page_no, start, text))
+        used += len(text)
+        if used >= budget:
+            break
+    return "\n[...]\n".join(text for _, _, text in sorted(chosen))
+
+
+def extract_text_from_pdf(path, anchors=()):
+    """Text of the PDF for the LLM prompt, windowed around `anchors` (the known BIN/PCN/Group ID)."""
     try:
         if not os.path.exists(path):
             print(f"❌ PDF file not found: {path}")
             return ""
 
-        doc = fitz.open(path)
-        for page in doc:
-            text += page.get_text()
-        return text[:6000]  # truncate for LLM prompt size limit
+        with fitz.open(path) as doc:
+            return select_context((page.get_text() for page in doc), anchors)
     except Exception as e:
         print(f"Failed to extract text from {path}: {e}")
-        return ""
\ No newline at end of file
+        return ""
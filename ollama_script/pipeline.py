@@ -0,0 +1,405 @@
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from tqdm import tqdm
+from parse import parse_bpg, parse_llm_output
+from ask_ollama import PARALLEL_REQUESTS, ask_ollama, get_client
+from pdf import SEARCH_URL, download_pdf, extract_text_from_pdf, get_downloader
+from browser_pool import BrowserPool
+from search_cache import CACHE_PATH, SearchCache, normalize_query
+from downloader import pdf_hash
+from doc_cache import DocumentCache
+
+# -------- Stage limits --------
+# search -> download -> extract -> LLM -> writer, with a bounded queue between each two stages,
+# so a slow stage (usually the LLM) holds the others back instead of piling up work in memory
+SEARCH_WORKERS = 2       # concurrent searches (pages of one pooled headless browser)
+DOWNLOAD_WORKERS = 8     # BPGs whose PDFs are being downloaded at once
+DOWNLOADS_PER_HOST = 2   # concurrent downloads from any one host
+EXTRACT_WORKERS = 2      # concurrent PDF text extractions (CPU bound)
+LLM_SLOTS = PARALLEL_REQUESTS  # concurrent ask_ollama calls (set in ask_ollama.py)
+QUEUE_SIZE = 16          # BPGs buffered between two stages
+PROGRESS_EVERY = 2.0     # seconds between progress bar updates
+GROUP_BPGS = True        # one search / PDF set / LLM extraction per BIN+PCN instead of per BPG
+
+STAGES = ["search", "download", "extract", "llm"]
+DONE = object()  # end-of-input marker, passed along from stage to stage
+
+
+def build_query(bpg_data):
+    return " ".join([
+        f"BIN {bpg_data['BIN']}" if bpg_data['BIN'] else "",
+        f"PCN {bpg_data['PCN']}" if bpg_data['PCN'] else "",
+        f"GroupID {bpg_data['GroupID']}" if bpg_data['GroupID'] else "",
+        "filetype:pdf"
+    ]).strip()
+
+
+def status_row(bpg_data, comment, status):
+    """The single output row of a BPG that produced no extraction."""
+    return [bpg_data['BIN'], bpg_data['PCN'], bpg_data['GroupID'], "", comment, "", status]
+
+
+def plan_groups(bpgs, group=True):
+    """
+    The work units for a list of BPG strings: BPGs sharing a BIN+PCN form one group, in order of
+    first appearance, since a payer sheet usually covers all of a BIN/PCN's group IDs. A group is
+    searched once (on BIN+PCN only) and its PDFs sent to the LLM once, with every group ID as a known
+    value. A BPG without a BIN, or any BPG when `group` is False, is a group of its own, as before.
+    Each unit: {'bpg': known values for the LLM, 'query', 'members': [(seq, bpg_data), ...], 'grouped'}.
+    """
+    groups = {}
+    for seq, bpg_str in enumerate(bpgs):
+        bpg_data = parse_bpg(bpg_str)
+        key = (bpg_data['BIN'], bpg_data['PCN']) if group and bpg_data['BIN'] else (None, seq)
+        groups.setdefault(key, []).append((seq, bpg_data))
+
+    units = []
+    for members in groups.values():
+        if len(members) == 1:
+            bpg_data = members[0][1]
+            units.append({'bpg': bpg_data, 'query': build_query(bpg_data), 'members': members, 'grouped': False})
+            continue
+        first = members[0][1]
+        group_ids = list(dict.fromkeys(b['GroupID'] for _, b in members if b['GroupID']))
+        units.append({
+            'bpg': {'BIN': first['BIN'], 'PCN': first['PCN'], 'GroupID': ", ".join(group_ids) or None},
+            'query': build_query({'BIN': first['BIN'], 'PCN': first['PCN'], 'GroupID': None}),
+            'members': members,
+            'grouped': True,
+        })
+    return units
+
+
+def table_offset(rows):
+    """
+    1 when the LLM wrote a markdown table with a leading `|` on every line (parse_llm_output then puts
+    an empty cell before the BIN), else 0. A table with its header line is never misread: the header
+    starts with "BIN".
+    """
+    return 1 if rows and all(r[0] == "" for r in rows) else 0
+
+
+def is_header_row(row, offset=0):
+    """
+    The table's header or separator line, which parse_llm_output keeps as a row. Judged by content:
+    "BIN | PCN | ..." or cells of only dashes/colons -- not by an empty first cell, which a row with a
+    blank BIN or a leading `|` also has.
+    """
+    cells = [c for c in row[offset:offset + 5] if c]
+    if cells and all(set(c) <= set("-: ") for c in cells):
+        return True
+    return [c.upper() for c in row[offset:offset + 2]] == ["BIN", "PCN"]
+
+
+def group_key(value):
+    value = (value or "").strip().upper()
+    return "" if value in ["N/A", "NA", "NONE", "NULL"] else value
+
+
+def resolve_rows(rows, members, grouped=True):
+    """
+    Split one LLM extraction between BPGs of a group (`members`, those still without rows): {seq: rows}
+    for the BPGs it has rows for. A BPG gets the rows with its group ID; failing that, the rows
+    without any group ID (plan-wide for the BIN/PCN). A BPG without a group ID gets every row, and so
+    does the BPG of a unit that is not `grouped` (a BPG on its own, as before grouping). Header and
+    separator rows are dropped either way.
+    """
+    offset = table_offset(rows)
+    rows = [r for r in rows if not is_header_row(r, offset)]
+    if not grouped:
+        return {members[0][0]: rows} if rows else {}
+    by_group, shared = defaultdict(list), []
+    for r in rows:
+        group = group_key(r[2 + offset])
+        (by_group[group] if group else shared).append(r)
+    resolved = {}
+    for seq, bpg_data in members:
+        if not bpg_data['GroupID']:
+            mine = rows
+        else:
+            mine = by_group.get(group_key(bpg_data['GroupID'])) or shared
+        if mine:
+            resolved[seq] = [list(r) for r in mine]  # copies: extraction_rows fills them in per BPG
+    return resolved
+
+
+def extraction_rows(rows, link):
+    """Parsed LLM rows with the PDF link and a status appended."""
+    for r in rows:
+        r[5] = link  # PDF link
+        if all([r[0], r[1], r[2], r[3]]):
+            status = "✅ Success"
+        elif any([r[0], r[1], r[2], r[3]]):
+            status = "⚠️ Partial extraction"
+        else:
+            status = "⚠️ No usable info"
+        r.append(status)
+    return rows
+
+
+class StageStats:
+    """Per-stage counters for the progress bar: BPG groups finished, in progress, and waiting in the queue."""
+
+    def __init__(self):
+        self.done = defaultdict(int)
+        self.active = defaultdict(int)
+        self.busy = defaultdict(float)  # seconds spent in each stage, summed over workers
+        self.queues = {}
+
+    def summary(self):
+        return " | ".join(
+            f"{stage} {self.done[stage]} (+{self.active[stage]}, q{self.queues[stage].qsize()})"
+            for stage in STAGES
+        )
+
+
+class Pipeline:
+    """
+    One run of the BPG workflow as concurrent stages. The stage functions are the blocking ones from
+    pdf.py / ask_ollama.py, run in worker threads; pass others (e.g. pointed at fake_server.py) to test.
+    Searches go through a BrowserPool on `search_url` unless a `search` function is given, and are
+    cached in `cache_path` (None: always search live); the browser is only started on a cache miss.
+    With `reuse_documents`, text and LLM answers are kept per PDF content hash (doc_cache.py), so a
+    PDF already worked through -- under any URL or name -- is neither re-read nor re-sent to the LLM.
+    BPGs are planned into BIN/PCN groups (plan_groups); each group is a dict moving through the stages,
+    and once it has its members' output rows ({seq: rows}), later stages pass it on.
+    """
+
+    def __init__(self, search=None, download=download_pdf, extract=extract_text_from_pdf, ask=ask_ollama,
+                 search_url=SEARCH_URL, cache_path=CACHE_PATH, reuse_documents=True, group_bpgs=GROUP_BPGS):
+        self.search, self.download, self.extract, self.ask = search, download, extract, ask
+        self.search_url = search_url
+        self.group_bpgs = group_bpgs
+        self.cache = SearchCache(cache_path) if cache_path else None
+        self.pool = None
+        self.pool_error = None  # why the browser pool could not start; every later search fails with it
+        self.pool_lock = asyncio.Lock()
+        # One live search per normalized query per run, shared by every BPG that asks it
+        self.searches = {}
+        self.stats = StageStats()
+        self.host_slots = defaultdict(lambda: asyncio.Semaphore(DOWNLOADS_PER_HOST))
+        self.extract_slots = asyncio.Semaphore(EXTRACT_WORKERS)
+        self.documents = DocumentCache() if reuse_documents else None
+        # One download per URL and one text extraction per PDF hash and known values per run, shared by every BPG needing it
+        self.downloads = {}
+        self.extractions = {}
+
+    # -------- Stages --------
+    def _status(self, item, comment, status):
+        """The same status row for every BPG of the group."""
+        return {seq: [status_row(bpg_data, comment, status)] for seq, bpg_data in item['members']}
+
+    async def _live_search(self, query):
+        if self.search is not None:
+            links = await asyncio.to_thread(self.search, query)
+        else:
+            async with self.pool_lock:
+                if self.pool_error is not None:
+                    raise self.pool_error
+                if self.pool is None:
+                    pool = BrowserPool(size=SEARCH_WORKERS, search_url=self.search_url)
+                    try:
+                        await pool.start()
+                    except Exception as e:
+                        self.pool_error = e
+                        try:
+                            await pool.close()
+                        except Exception:
+                            pass
+                        raise
+                    self.pool = pool  # only a started pool has page slots to wait on
+            links = await self.pool.search(query)
+        if self.cache is not None:
+            self.cache.put(query, links)
+        return links
+
+    async def search_stage(self, item):
+        try:
+            links = self.cache.get(item['query']) if self.cache is not None else None
+            if links is None:
+                key = normalize_query(item['query'])
+                if key not in self.searches:
+                    self.searches[key] = asyncio.ensure_future(self._live_search(item['query']))
+                links = await self.searches[key]
+            item['links'] = links
+        except Exception as e:
+            tqdm.write(f"[{item['seq'] + 1}] ❌ Error during search: {e}")
+            item['rows'] = self._status(item, "Search error", "❌ Search failed")
+            return item
+        if not item['links']:
+            item['rows'] = self._status(item, "No PDFs found", "❌ No PDF")
+        return item
+
+    async def _download(self, link):
+        async with self.host_slots[urlparse(link).netloc]:
+            try:
+                return await asyncio.to_thread(self.download, link)
+            except Exception as e:
+                tqdm.write(f"Download failed for {link}: {e}")
+                return None
+
+    async def download_stage(self, item):
+        # A BPG's candidate PDFs download side by side; the LLM stage still uses the first usable one
+        tasks = []
+        for link in item['links']:
+            if link not in self.downloads:
+                self.downloads[link] = asyncio.ensure_future(self._download(link))
+            tasks.append(self.downloads[link])
+        item['paths'] = await asyncio.gather(*tasks)
+        return item
+
+    async def _extract(self, path, md5, known, anchors):
+        text = self.documents.text(md5, *known) if self.documents is not None else None
+        if text is None:
+            async with self.extract_slots:
+                text = await asyncio.to_thread(self.extract, path, anchors)
+            if self.documents is not None and text:
+                self.documents.put_text(md5, *known, text)
+        return text
+
+    async def extract_stage(self, item):
+        # The text sent to the LLM is windowed around the group's known values (pdf.select_context)
+        known = (item['bpg']['BIN'], item['bpg']['PCN'], item['bpg']['GroupID'])
+        anchors = (item['bpg']['BIN'], item['bpg']['PCN'], *(b['GroupID'] for _, b in item['members']))
+        texts, hashes = [], []
+        for link, path in zip(item['links'], item['paths']):
+            if not path:
+                tqdm.write(f"[{item['seq'] + 1}] ⚠️  PDF download failed: {link}")
+                texts.append("")
+                hashes.append(None)
+                continue
+            try:
+                md5 = await asyncio.to_thread(pdf_hash, path)
+            except OSError as e:
+                tqdm.write(f"[{item['seq'] + 1}] ⚠️  Could not read downloaded PDF {path}: {e}")
+                texts.append("")
+                hashes.append(None)
+                continue
+            if (md5, known) not in self.extractions:
+                self.extractions[md5, known] = asyncio.ensure_future(self._extract(path, md5, known, anchors))
+            texts.append(await self.extractions[md5, known])
+            hashes.append(md5)
+        item['texts'], item['hashes'] = texts, hashes
+        return item
+
+    async def _answer(self, md5, text, bpg):
+        known = (bpg['BIN'], bpg['PCN'], bpg['GroupID'])
+        llm_output = self.documents.answer(md5, *known) if self.documents is not None else None
+        if llm_output is None:
+            llm_output = await asyncio.to_thread(self.ask, text, *known)
+            if self.documents is not None and llm_output.strip():
+                self.documents.put_answer(md5, *known, llm_output)
+        return llm_output
+
+    async def llm_stage(self, item):
+        # PDFs in search order; each BPG of the group takes its rows from the first PDF that has any
+        resolved = {}
+        for link, text, md5 in zip(item['links'], item['texts'], item['hashes']):
+            if not text:
+                continue
+            llm_output = await self._answer(md5, text, item['bpg'])
+            if not llm_output.strip():
+                tqdm.write(f"[{item['seq'] + 1}] ⚠️  LLM output was empty: {link}")
+                continue
+            rows = parse_llm_output(llm_output)
+            if not rows:
+                tqdm.write(f"[{item['seq'] + 1}] ⚠️  LLM output could not be parsed: {link}")
+                continue
+            waiting = [m for m in item['members'] if m[0] not in resolved]
+            for seq, member_rows in resolve_rows(rows, waiting, item['grouped']).items():
+                resolved[seq] = extraction_rows(member_rows, link)
+            if len(resolved) == len(item['members']):
+                break
+        item['rows'] = {seq: resolved.get(seq) or [status_row(bpg_data, "No usable PDF found", "⚠️ No usable info")]
+                        for seq, bpg_data in item['members']}
+        return item
+
+    # -------- Plumbing --------
+    async def _worker(self, stage, handler, queue_in, queue_out):
+        while True:
+            item = await queue_in.get()
+            if item is DONE:
+                queue_in.put_nowait(DONE)  # let the other workers of this stage see it too
+                return
+            if item.get('rows') is None:
+                self.stats.active[stage] += 1
+                start = time.perf_counter()
+                item = await handler(item)
+                self.stats.busy[stage] += time.perf_counter() - start
+                self.stats.active[stage] -= 1
+            self.stats.done[stage] += 1
+            await queue_out.put(item)
+
+    async def _stage(self, stage, handler, workers, queue_in, queue_out):
+        await asyncio.gather(*[self._worker(stage, handler, queue_in, queue_out) for _ in range(workers)])
+        await queue_out.put(DONE)
+
+    async def _feed(self, units, queue):
+        for unit in units:
+            await queue.put(dict(unit, seq=unit['members'][0][0], rows=None))
+        await queue.put(DONE)
+
+    async def _write(self, queue, write, total):
+        """Hand each BPG's rows to `write` in input order, holding back BPGs that finished early."""
+        finished, next_seq = {}, 0
+        last_update = 0.0
+        with tqdm(total=total, desc="Processing BPGs") as bar:
+            while True:
+                item = await queue.get()
+                if item is DONE:
+                    break
+                finished.update(item['rows'])
+                while next_seq in finished:
+                    write(finished.pop(next_seq))
+                    next_seq += 1
+                    bar.update(1)
+                if time.perf_counter() - last_update >= PROGRESS_EVERY:
+                    bar.set_postfix_str(self.stats.summary())
+                    last_update = time.perf_counter()
+            bar.set_postfix_str(self.stats.summary())
+
+    async def run(self, bpgs, write):
+        bpgs = list(bpgs)
+        units = plan_groups(bpgs, self.group_bpgs)
+        if len(units) < len(bpgs):
+            print(f"🔄 {len(bpgs)} BPGs in {len(units)} BIN/PCN groups")
+        queues = [asyncio.Queue(QUEUE_SIZE) for _ in range(len(STAGES) + 1)]
+        self.stats.queues = dict(zip(STAGES, queues))
+        handlers = [self.search_stage, self.download_stage, self.extract_stage, self.llm_stage]
+        workers = [SEARCH_WORKERS, DOWNLOAD_WORKERS, EXTRACT_WORKERS, LLM_SLOTS]
+
+        # Threads for the blocking stage functions; calls beyond this wait for a free thread
+        threads = SEARCH_WORKERS + DOWNLOAD_WORKERS * DOWNLOADS_PER_HOST + EXTRACT_WORKERS + LLM_SLOTS
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=threads))
+        try:
+            await asyncio.gather(
+                self._feed(units, queues[0]),
+                *[self._stage(stage, handler, n, queues[i], queues[i + 1])
+                  for i, (stage, handler, n) in enumerate(zip(STAGES, handlers, workers))],
+                self._write(queues[-1], write, len(bpgs)),
+            )
+        finally:
+            if self.pool is not None:
+                await self.pool.close()
+                print(f"🔄 {self.pool.summary()}")
+            if self.cache is not None:
+                print(f"🔄 {self.cache.summary()}")
+            if self.download is download_pdf:
+                print(f"🔄 {get_downloader().summary()}")
+            if self.documents is not None:
+                print(f"🔄 {self.documents.summary()}")
+            if self.ask is ask_ollama:
+                print(f"🔄 {get_client().summary()}")
+        return dict(self.stats.busy)
+
+
+def run_pipeline(bpgs, write, **options):
+    """
+    Process BPG strings ("BIN~PCN~GROUP") through the staged pipeline; `write(rows)` gets each BPG's
+    output rows in input order. `options` go to Pipeline. Returns the seconds each stage spent
+    working, summed over its workers.
+    """
+    return asyncio.run(Pipeline(**options).run(bpgs, write))
@@ -0,0 +1,91 @@
+import os
+import random
+import tempfile
+import time
+from functools import partial
+from parse import parse_bpg, parse_llm_output
+from pdf import search_pdf_links, download_pdf, extract_text_from_pdf
+from ask_ollama import OllamaClient, ask_ollama
+import pipeline
+from pipeline import run_pipeline, build_query, status_row, extraction_rows, is_header_row
+from fake_server import FakeServer
+
+# Offline throughput test: the same BPGs through the old one-at-a-time loop and through the staged
+# pipeline, both against fake_server.py (real Playwright search -- a browser per query in the loop,
+# the pooled browser in the pipeline -- downloads and PyMuPDF extraction; the LLM is ask_ollama's
+# HTTP client against the fake server's /api/chat, with LLM_DELAY per call). The pipeline runs once
+# per BPG and once grouped by BIN/PCN (the BPGs share N_PAYERS BIN/PCN pairs), then a second time
+# grouped against the same server, as a rerun over the same BPG list: its searches, PDF texts and LLM
+# answers should all come from the caches. Everything is written under a fresh temp directory, so
+# earlier runs do not count.
+
+# --- CONFIGURATION ---
+N_BPGS = 20
+N_PAYERS = 6          # distinct BIN/PCN pairs among the BPGs
+SEARCH_DELAY = 1.0
+DOWNLOAD_DELAY = 0.5
+LLM_DELAY = 2.0
+LLM_PARALLEL = 2
+SEED = 7
+
+
+def sequential(bpgs, search, ask, write):
+    """The old main() loop: one BPG at a time, each step blocking."""
+    for bpg_str in bpgs:
+        bpg_data = parse_bpg(bpg_str)
+        pdf_links = search(build_query(bpg_data))
+        if not pdf_links:
+            write([status_row(bpg_data, "No PDFs found", "❌ No PDF")])
+            continue
+        for link in pdf_links:
+            pdf_path = download_pdf(link)
+            known = (bpg_data['BIN'], bpg_data['PCN'], bpg_data['GroupID'])
+            text = extract_text_from_pdf(pdf_path, known) if pdf_path else ""
+            rows = parse_llm_output(ask(text, bpg_data['BIN'], bpg_data['PCN'], bpg_data['GroupID'])) if text else []
+            if rows:
+                write(extraction_rows(rows, link))
+                break
+        else:
+            write([status_row(bpg_data, "No usable PDF found", "⚠️ No usable info")])
+
+
+def main():
+    rng = random.Random(SEED)
+    payers = [f"{rng.randint(1, 999999):06d}~P{rng.randint(1, 99)}" for _ in range(N_PAYERS)]
+    bpgs = [f"{rng.choice(payers)}~GRP{rng.randint(1000, 9999)}" for _ in range(N_BPGS)]
+
+    pipeline.LLM_SLOTS = LLM_PARALLEL
+    os.chdir(tempfile.mkdtemp())
+    results = {}
+    for name in ["Sequential", "Pipeline", "Grouped"]:
+        # A fresh server per run (new PDF URLs), so each run downloads again instead of reusing the last one's URLs
+        with FakeServer(search_delay=SEARCH_DELAY, download_delay=DOWNLOAD_DELAY,
+                        llm_delay=LLM_DELAY, llm_parallel=LLM_PARALLEL) as server:
+            search = partial(search_pdf_links, search_url=server.search_url)
+            ask = partial(ask_ollama, client=OllamaClient(url=server.url))
+            runs = [name, "Rerun"] if name == "Grouped" else [name]
+            for run in runs:
+                rows = []
+                before = dict(server.requests)
+                start = time.perf_counter()
+                if run == "Sequential":
+                    sequential(bpgs, search, ask, rows.extend)
+                else:
+                    run_pipeline(bpgs, rows.extend, search_url=server.search_url, ask=ask, group_bpgs=run != "Pipeline")
+                # Links differ per server; grouped runs leave out the LLM's table header lines
+                rows = [r[:5] + r[6:] for r in rows if not is_header_row(r)]
+                results[run] = (time.perf_counter() - start, server.requests["search"] - before["search"],
+                                server.requests["llm"] - before["llm"], rows)
+
+    print(f"\nFiles in {os.getcwd()}")
+    print(f"{N_BPGS} BPGs, search {SEARCH_DELAY}s, download {DOWNLOAD_DELAY}s, LLM {LLM_DELAY}s ({LLM_PARALLEL} parallel)")
+    for name, (seconds, searches, llm_calls, rows) in results.items():
+        print(f"  {name:<10} {seconds:7.1f}s  {N_BPGS / seconds * 60:6.1f} BPGs/min  {len(rows)} rows  "
+              f"{searches} live searches  {llm_calls} LLM calls")
+    for name in ["Pipeline", "Grouped", "Rerun"]:
+        same = results["Sequential"][3] == results[name][3]
+        print(f"{'✅' if same else '⚠️'} {name} rows {'match' if same else 'differ from'} the sequential loop.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import json
+import os
+from openpyxl import Workbook, load_workbook
+
+# -------- Writer settings --------
+SAVE_EVERY = 500   # rows between saves of the .xlsx; every row is in the journal as soon as it is written
+
+
+class ResultsWriter:
+    """
+    Output rows appended to an .xlsx without re-saving the workbook for every BPG (openpyxl rewrites
+    the whole file on each save, so per-BPG saves grow quadratically with the run). Each write goes
+    to a JSON-lines journal next to the workbook, flushed to disk at once; the workbook is saved every
+    `save_every` rows and on close, after which the journal starts over.
+    The journal's first line records how many rows the workbook had when it was started, so after a
+    crash the rows that never reached the workbook are found and added when the writer is next opened.
+    Use as `with ResultsWriter(path, header) as writer: writer.write(rows)`.
+    """
+
+    def __init__(self, output_path, header, save_every=SAVE_EVERY):
+        self.output_path = output_path
+        self.journal_path = output_path + ".journal.jsonl"
+        self.save_every = save_every
+        self.pending = 0
+        self.journal = None
+        if os.path.exists(output_path):
+            self.wb = load_workbook(output_path)
+            self.ws = self.wb.active
+        else:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            self.wb = Workbook()
+            self.ws = self.wb.active
+            self.ws.append(header)
+        self._recover()
+        self.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _rows_in_workbook(self):
+        return self.ws.max_row - 1  # minus the header
+
+    def _recover(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        try:
+            base = json.loads(lines[0])["base"]
+        except (IndexError, ValueError, KeyError):
+            print(f"⚠️ Ignoring unreadable journal {self.journal_path}")
+            return
+        rows = []
+        for line in lines[1:]:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                break  # a line cut short by the crash; everything before it is complete
+        # Rows past `base` that are already in the workbook were saved before the journal was reset
+        missing = rows[max(self._rows_in_workbook() - base, 0):]
+        for row in missing:
+            self.ws.append(row)
+        if missing:
+            print(f"🔄 Recovered {len(missing)} row(s) from {self.journal_path}")
+
+    def _reset_journal(self):
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"base": self._rows_in_workbook()}) + "\n")
+        os.replace(tmp_path, self.journal_path)
+        self.journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def write(self, rows):
+        """Add one BPG's output rows."""
+        for row in rows:
+            self.journal.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self.ws.append(row)
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.pending += len(rows)
+        if self.pending >= self.save_every:
+            self.save()
+
+    def save(self):
+        """Write the workbook (via a temp file, so a crash mid-save keeps the old one) and restart the journal."""
+        tmp_path = self.output_path + ".tmp.xlsx"
+        self.wb.save(tmp_path)
+        os.replace(tmp_path, self.output_path)
+        if self.journal is not None:
+            self.journal.close()
+        self._reset_journal()
+        self.pending = 0
+
+    def close(self):
+        self.save()
+        self.journal.close()
+        os.remove(self.journal_path)
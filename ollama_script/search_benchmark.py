@@ -0,0 +1,53 @@
+import asyncio
+import statistics
+import time
+from pdf import search_pdf_links
+from browser_pool import BrowserPool
+from fake_server import FakeServer
+
+# Per-query search latency: a fresh browser per query (search_pdf_links) against the pooled browser
+# (BrowserPool), both on fake_server.py, so the difference is the browser launch overhead.
+
+# --- CONFIGURATION ---
+N_QUERIES = 20
+POOL_SIZE = 2
+SEARCH_DELAY = 0.3
+
+
+def describe(name, latencies, wall):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"  {name:<22} per query mean {statistics.mean(latencies):5.2f}s  p95 {p95:5.2f}s   "
+          f"all {len(latencies)} queries {wall:6.1f}s")
+
+
+async def pooled(queries, search_url):
+    async with BrowserPool(size=POOL_SIZE, search_url=search_url) as pool:
+        start = time.perf_counter()
+        links = await asyncio.gather(*[pool.search(query) for query in queries])
+        wall = time.perf_counter() - start
+    print(f"  {pool.summary()}")
+    return pool.latencies, wall, links
+
+
+def main():
+    queries = [f"BIN {600000 + i} PCN P{i} filetype:pdf" for i in range(N_QUERIES)]
+    with FakeServer(search_delay=SEARCH_DELAY) as server:
+        latencies, fresh_links = [], []
+        start = time.perf_counter()
+        for query in queries:
+            query_start = time.perf_counter()
+            fresh_links.append(search_pdf_links(query, search_url=server.search_url))
+            latencies.append(time.perf_counter() - query_start)
+        fresh_wall = time.perf_counter() - start
+        pool_latencies, pool_wall, pool_links = asyncio.run(pooled(queries, server.search_url))
+
+    print(f"\n{N_QUERIES} queries, search page delay {SEARCH_DELAY}s")
+    describe("browser per query", latencies, fresh_wall)
+    describe(f"pool of {POOL_SIZE} pages", pool_latencies, pool_wall)
+    print(f"Launch overhead per query: ~{statistics.mean(latencies) - statistics.mean(pool_latencies):.2f}s")
+    print(f"{'✅' if fresh_links == pool_links else '⚠️'} Same links from both.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import json
+import os
+import re
+import time
+
+# -------- Cache settings --------
+CACHE_PATH = "./output/search_cache.jsonl"
+TTL_DAYS = 30          # how long a query's links are reused before searching again
+EMPTY_TTL_DAYS = 3     # shorter for queries that found no PDFs, so they get retried sooner
+
+
+def normalize_query(query):
+    """Cache key of a search query: case-folded, whitespace collapsed (Bing ignores both)."""
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+class SearchCache:
+    """
+    Persistent query -> PDF links cache, kept as a JSON-lines file that is only ever appended to
+    (the last line for a query wins), so an interrupted run loses at most the line being written.
+    Empty results are cached too, with their own shorter TTL. Failed searches are not cached.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl_days=TTL_DAYS, empty_ttl_days=EMPTY_TTL_DAYS):
+        self.path = path
+        self.ttl, self.empty_ttl = ttl_days * 86400, empty_ttl_days * 86400
+        self.entries = {}  # normalized query -> {"links": [...], "at": epoch seconds}
+        self.hits = self.misses = self.expired = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.entries[entry["query"]] = {"links": entry["links"], "at": entry["at"]}
+                    lines += 1
+                except (ValueError, KeyError):
+                    print(f"⚠️ Skipping unreadable line in {self.path}")
+        # Drop entries past their TTL and the lines they replaced once the file is mostly stale
+        live = {q: e for q, e in self.entries.items() if self._fresh(e)}
+        if lines > 2 * len(live) + 100:
+            self.entries = live
+            self._rewrite()
+
+    def _fresh(self, entry):
+        ttl = self.ttl if entry["links"] else self.empty_ttl
+        return time.time() - entry["at"] < ttl
+
+    def _rewrite(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for query, entry in self.entries.items():
+                f.write(json.dumps({"query": query, **entry}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def get(self, query):
+        """Cached links for `query` ([] if it found nothing), or None when it needs a live search."""
+        entry = self.entries.get(normalize_query(query))
+        if entry is None:
+            self.misses += 1
+            return None
+        if not self._fresh(entry):
+            self.expired += 1
+            return None
+        self.hits += 1
+        return list(entry["links"])
+
+    def put(self, query, links):
+        key = normalize_query(query)
+        entry = {"links": list(links), "at": time.time()}
+        self.entries[key] = entry
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"query": key, **entry}) + "\n")
+
+    def summary(self):
+        return (f"Search cache: {self.hits} hit(s), {self.misses} miss(es), {self.expired} expired, "
+                f"{len(self.entries)} queries stored")
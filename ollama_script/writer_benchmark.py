@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+from openpyxl import Workbook, load_workbook
+from results_writer import ResultsWriter
+
+# Cost of writing the output workbook: wb.save() after every BPG (the old main.py) against
+# ResultsWriter's journal plus a save every SAVE_EVERY rows. No searches or LLM, just the writes.
+
+# --- CONFIGURATION ---
+N_BPGS = 2000
+ROWS_PER_BPG = 2
+SAVE_EVERY = 500
+HEADER = ["BIN", "PCN", "GroupID", "Plan Type", "Comments", "PDF Link", "Status"]
+
+
+def bpg_rows(i):
+    return [[f"{600000 + i}", f"P{i % 97}", f"GRP{i}", "Medicare Part D", "Fake extraction",
+             f"https://example.com/{i}.pdf", "✅ Success"] for _ in range(ROWS_PER_BPG)]
+
+
+def save_per_bpg(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADER)
+    wb.save(path)
+    for i in range(N_BPGS):
+        for r in bpg_rows(i):
+            ws.append(r)
+        wb.save(path)
+
+
+def journaled(path):
+    with ResultsWriter(path, HEADER, save_every=SAVE_EVERY) as writer:
+        for i in range(N_BPGS):
+            writer.write(bpg_rows(i))
+
+
+def main():
+    folder = tempfile.mkdtemp()
+    results = {}
+    for name, run in [("wb.save per BPG", save_per_bpg), (f"journal, save every {SAVE_EVERY}", journaled)]:
+        path = os.path.join(folder, f"{run.__name__}.xlsx")
+        start = time.perf_counter()
+        run(path)
+        results[name] = (time.perf_counter() - start, load_workbook(path, read_only=True).active.max_row - 1)
+
+    print(f"\n{N_BPGS} BPGs x {ROWS_PER_BPG} rows")
+    for name, (seconds, rows) in results.items():
+        print(f"  {name:<24} {seconds:7.1f}s  {rows} rows in the workbook")
+
+
+if __name__ == "__main__":
+    main()